@@ -0,0 +1,4 @@
+"""
+性能基准测试：生成可复现的订单，分阶段测量方案生成和求解的用时、内存和方案数。
+运行方法：python -m benchmarks --help
+"""
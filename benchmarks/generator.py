@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from support import SupportBracket
+
+# 常见规格的取值范围（mm）
+C_HEIGHTS = np.arange(80, 301, 20)
+C_WIDTHS = np.arange(40, 81, 5)
+C_LIPS = np.arange(10, 26, 5)
+U_HEIGHTS = np.arange(60, 201, 20)
+U_WIDTHS = np.arange(30, 61, 5)
+PIPE_DIAMETERS = np.array([48, 60, 76, 89, 102, 114])
+THICKNESSES = np.array([1.5, 2.0, 2.5, 3.0])
+LENGTHS = np.arange(3000, 12001, 250)
+
+
+def _random_spec(rng, thickness):
+    """随机生成一个C型钢、U型钢或圆管的规格"""
+    shape = rng.choice(["C", "U", "Φ"], p=[0.6, 0.25, 0.15])
+    length = int(rng.choice(LENGTHS))
+    if shape == "C":
+        return (f"C{int(rng.choice(C_HEIGHTS))}*{int(rng.choice(C_WIDTHS))}*{int(rng.choice(C_LIPS))}"
+                f"*{thickness}*{length}")
+    if shape == "U":
+        return f"U{int(rng.choice(U_HEIGHTS))}*{int(rng.choice(U_WIDTHS))}*{thickness}*{length}"
+    return f"Φ{int(rng.choice(PIPE_DIAMETERS))}*{thickness}*{length}"
+
+
+def generate_order(n_widths, seed=0, thickness=None, grade="Q235", material_type="低碳钢"):
+    """
+    生成一个分组（同一材质、厚度）的订单，展开宽度恰好有n_widths种。
+    :param n_widths: 不同展开宽度的数量
+    :param seed: 随机数种子，相同的种子生成相同的订单
+    :param thickness: 厚度，None表示随机选择
+    :return: DataFrame，列与输入模板一致：name、grade、material_type、specification、count，
+             另有thickness、unfolded_width和length
+    """
+    rng = np.random.default_rng(seed)
+    if thickness is None:
+        thickness = float(rng.choice(THICKNESSES))
+
+    rows, widths = [], set()
+    for _ in range(1000 * n_widths):
+        if len(widths) >= n_widths:
+            break
+        bracket = SupportBracket(count=int(rng.integers(20, 2000)),
+                                 specification=_random_spec(rng, thickness))
+        if bracket.unfolded_width in widths:
+            continue
+        widths.add(bracket.unfolded_width)
+        rows.append({"name": f"支架{len(rows) + 1}",
+                     "grade": grade,
+                     "material_type": material_type,
+                     "specification": bracket.specification,
+                     "thickness": thickness,
+                     "count": bracket.count,
+                     "unfolded_width": bracket.unfolded_width,
+                     "length": bracket.length})
+    if len(widths) < n_widths:
+        raise ValueError(f"无法生成{n_widths}种不同的展开宽度")
+    return pd.DataFrame(rows)
+
+
+def order_to_products(order):
+    """与界面相同，把订单汇总为求解用的products（width和total_length）"""
+    products = pd.DataFrame({"width": order["unfolded_width"].astype(float),
+                             "total_length": order["count"] * order["length"]})
+    return products.groupby("width").sum().reset_index()
+
+
+def generate_raw_materials(kind="continuous", low=1000, high=1300, n_discrete=5, seed=0):
+    """
+    :param kind: "continuous"：low到high之间的全部整数宽度；"discrete"：其中随机的n_discrete种宽度
+    :return: DataFrame，包含width，已排序
+    """
+    if kind == "continuous":
+        widths = np.arange(low, high + 1)
+    elif kind == "discrete":
+        rng = np.random.default_rng(seed)
+        widths = np.sort(rng.choice(np.arange(low, high + 1), size=n_discrete, replace=False))
+    else:
+        raise ValueError(f"不支持的原料类型：{kind}")
+    return pd.DataFrame({"width": widths})
+
+
+def default_cost_df():
+    """与界面默认值相同的价格表"""
+    return pd.DataFrame({"start_width": [1000, 1250], "cost": [3460, 3410]})
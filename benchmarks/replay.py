@@ -0,0 +1,119 @@
+"""
+回放录制的求解实例（见solve_capture.SolveCapture），与录制时的用时、成本和方案数比较，找出性能退化。
+用法示例：python -m benchmarks.replay captures --output replay_results.jsonl
+"""
+import argparse
+import contextlib
+import io
+import json
+import time
+
+from benchmarks.run import _environment
+from solution import Solution
+from solve_capture import SolveCapture
+
+
+def replay_instance(instance, cache=None):
+    """
+    按录制的输入和参数重新求解一个实例
+    :param instance: SolveCapture.load的结果
+    :param cache: 枚举方案时使用的PatternCache，None表示不使用缓存，每次都完整生成方案
+    :return: dict，与录制的recorded格式相同
+    """
+    solution = Solution(raw_materials=instance["raw_materials"], products=instance["products"],
+                        cost_df=instance["cost_df"], cache=cache)
+    start = time.perf_counter()
+    error = None
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = solution.solve(**instance["options"])
+        if result is None:
+            error = "未找到可行解"
+    except Exception as e:
+        result, error = None, f"{type(e).__name__}: {e}"
+    return {"elapsed": time.perf_counter() - start, "error": error, "status": solution.status,
+            "objective_value": solution.objective_value, "best_bound": solution.best_bound, "gap": solution.gap,
+            "n_patterns": len(result) if result is not None else 0, "stats": solution.stats.to_dict()}
+
+
+def _comparable_elapsed(run, exclude_enumeration):
+    """求解用时，exclude_enumeration时扣除枚举成品组合（可能来自缓存）的用时"""
+    if not exclude_enumeration:
+        return run["elapsed"]
+    return run["elapsed"] - run["stats"].get("timings", {}).get("enumerate", 0.0)
+
+
+def find_regressions(recorded, replayed, options, time_ratio=1.5, min_seconds=0.5):
+    """
+    比较回放与录制的结果
+    :param options: 录制的求解参数，成本允许相差的比例取录制时的差距和rel_gap中较大的
+    :param time_ratio: 用时超过录制时的该倍数，且多出min_seconds秒以上，视为用时退化；
+                       只有一方的枚举结果来自缓存时，双方都扣除枚举的用时再比较
+    :return: list，每项为一条退化的说明，没有退化时为空
+    """
+    regressions = []
+    excluded = bool(recorded["stats"].get("cache_hit")) != bool(replayed["stats"].get("cache_hit"))
+    recorded_elapsed = _comparable_elapsed(recorded, excluded)
+    replayed_elapsed = _comparable_elapsed(replayed, excluded)
+    if replayed_elapsed > recorded_elapsed * time_ratio and replayed_elapsed - recorded_elapsed > min_seconds:
+        label = "不含枚举的用时" if excluded else "用时"
+        regressions.append(f"{label}{recorded_elapsed:.2f}s -> {replayed_elapsed:.2f}s")
+
+    if recorded["objective_value"] is not None:
+        tolerance = max(recorded["gap"] or 0.0, options.get("rel_gap") or Solution.RELATIVE_MIP_GAP)
+        if replayed["objective_value"] is None:
+            regressions.append(f"没有可行解：{replayed['error']}")
+        elif replayed["objective_value"] > recorded["objective_value"] * (1 + tolerance):
+            regressions.append(f"成本{recorded['objective_value']:.6g} -> {replayed['objective_value']:.6g}")
+
+    recorded_counts = recorded["stats"].get("pattern_counts", {})
+    replayed_counts = replayed["stats"].get("pattern_counts", {})
+    if recorded_counts != replayed_counts:
+        changed = "，".join(f"{name} {recorded_counts.get(name)} -> {replayed_counts.get(name)}"
+                           for name in sorted(set(recorded_counts) | set(replayed_counts))
+                           if recorded_counts.get(name) != replayed_counts.get(name))
+        regressions.append(f"方案数{changed}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="回放录制的求解实例，比较用时、成本和方案数")
+    parser.add_argument("capture_dir", help="录制目录")
+    parser.add_argument("--time-ratio", type=float, default=1.5, help="用时超过录制时的该倍数视为退化")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="用时至少多出该秒数才视为退化")
+    parser.add_argument("--output", default=None, help="把每个实例的比较结果以JSON lines追加到该文件")
+    args = parser.parse_args(argv)
+
+    paths = SolveCapture(args.capture_dir).instances()
+    if not paths:
+        parser.error(f"{args.capture_dir}中没有录制的实例")
+    environment = _environment()
+    output = open(args.output, "a", encoding="utf-8") if args.output else contextlib.nullcontext()
+    failed = 0
+    with output as f:
+        for i, path in enumerate(paths, start=1):
+            prefix = f"[{i}/{len(paths)}] {path.stem[:12]}"
+            try:
+                instance = SolveCapture.load(path)
+            except (OSError, ValueError, KeyError) as e:
+                print(f"{prefix}：无法读取：{e}")
+                continue
+            replayed = replay_instance(instance)
+            regressions = find_regressions(instance["recorded"], replayed, instance["options"],
+                                           args.time_ratio, args.min_seconds)
+            failed += bool(regressions)
+            if f is not None:
+                f.write(json.dumps({"instance": path.stem, "options": instance["options"],
+                                    "recorded": instance["recorded"], "replayed": replayed,
+                                    "regressions": regressions, "environment": environment},
+                                   ensure_ascii=False) + "\n")
+                f.flush()
+            summary = (f"用时{replayed['elapsed']:.2f}s（录制{instance['recorded']['elapsed']:.2f}s），"
+                       f"{replayed['status']}")
+            print(f"{prefix}：{summary}" + (f"，退化：{'；'.join(regressions)}" if regressions else ""))
+    print(f"共{len(paths)}个实例，{failed}个退化")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,139 @@
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import ortools
+import pandas as pd
+
+from benchmarks.generator import default_cost_df, generate_order, generate_raw_materials, order_to_products
+from solution import CuttingPatterns, Solution
+
+
+def _measure(func, memory=True):
+    """
+    运行func，返回 (结果, 用时秒数, 峰值内存字节数)。
+    峰值内存用tracemalloc在单独的一次运行中测量，避免影响计时；memory=False时为None。
+    """
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run_case(n_widths, raw_kind, tolerance, max_patterns, seed=0, time_limit=60, method="exhaustive",
+             memory=True):
+    """
+    测量一个算例，各阶段分别计时：
+    generate（_generate_patterns）、price（_price_patterns）、filter（_filter_patterns）、
+    generate_priced（实际使用的一次枚举方法）以及solve（Solution.solve，不使用方案缓存）。
+    :param tolerance: 边丝容忍度（mm），None表示与Solution相同，取最窄成品宽度
+    :return: dict，一条基准测试记录
+    """
+    order = generate_order(n_widths, seed=seed)
+    products = order_to_products(order)
+    raw_materials = generate_raw_materials(raw_kind, seed=seed)
+    cost_df = default_cost_df()
+    if tolerance is None:
+        tolerance = float(products.width.min())
+
+    record = {"n_widths": n_widths, "raw_kind": raw_kind, "n_raw_widths": len(raw_materials),
+              "tolerance": tolerance, "max_patterns": max_patterns, "seed": seed, "method": method,
+              "thickness": float(order["thickness"].iloc[0]),
+              "product_widths": products.width.tolist(), "timings": {}, "peak_memory": {}, "pattern_counts": {}}
+
+    def stage(name, func, stage_memory=memory):
+        result, elapsed, peak = _measure(func, stage_memory)
+        record["timings"][name] = elapsed
+        record["peak_memory"][name] = peak
+        return result
+
+    generator = CuttingPatterns(products=products, raw_materials=raw_materials, cache=None)
+    patterns = stage("generate", lambda: generator._generate_patterns(tolerance))
+    priced = stage("price", lambda: CuttingPatterns._price_patterns(patterns.copy(), cost_df))
+    filtered = stage("filter", lambda: CuttingPatterns._filter_patterns(priced))
+    combined = stage("generate_priced", lambda: generator._generate_priced_patterns(tolerance, cost_df))
+    record["pattern_counts"].update(generated=len(patterns), filtered=len(filtered), generate_priced=len(combined))
+
+    # 求解器的内存不经过Python分配，tracemalloc测不到，因此求解阶段只计时
+    solution = Solution(raw_materials=raw_materials, products=products, cost_df=cost_df.copy(), cache=None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        stage("solve", lambda: solution.solve(max_patterns, method=method, time_limit=time_limit,
+                                              tolerance=tolerance), False)
+    record["solve_stats"] = solution.stats.to_dict()
+    record.update(status=solution.status, objective_value=solution.objective_value,
+                  best_bound=solution.best_bound, gap=solution.gap)
+    return record
+
+
+def _environment():
+    """记录运行环境，便于比较不同版本的结果"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "ortools": ortools.__version__}
+
+
+def _tolerance(value):
+    return None if value == "min" else float(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="裁剪方案生成和求解的基准测试")
+    parser.add_argument("--n-widths", type=int, nargs="+", default=[3, 4, 5, 6],
+                        help="不同展开宽度的数量")
+    parser.add_argument("--raw-kind", nargs="+", default=["continuous", "discrete"],
+                        choices=["continuous", "discrete"], help="原料宽度为连续范围或分立宽度")
+    parser.add_argument("--tolerance", type=_tolerance, nargs="+", default=[None, 50.0],
+                        help="边丝容忍度(mm)，min表示取最窄成品宽度")
+    parser.add_argument("--max-patterns", type=int, nargs="+", default=[3, 5], help="最多使用的裁剪方案数")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0], help="随机数种子")
+    parser.add_argument("--method", default="exhaustive", choices=["exhaustive", "column_generation"])
+    parser.add_argument("--time-limit", type=float, default=60, help="每个算例的最长求解时间（秒）")
+    parser.add_argument("--no-memory", action="store_true", help="不测量峰值内存（节省一半时间）")
+    parser.add_argument("--output", default="benchmark_results.jsonl",
+                        help="结果文件，每行一条JSON记录，追加写入")
+    args = parser.parse_args(argv)
+
+    environment = _environment()
+    cases = list(itertools.product(args.n_widths, args.raw_kind, args.tolerance, args.max_patterns, args.seeds))
+    with open(args.output, "a", encoding="utf-8") as f:
+        for i, (n_widths, raw_kind, tolerance, max_patterns, seed) in enumerate(cases, start=1):
+            record = run_case(n_widths, raw_kind, tolerance, max_patterns, seed=seed, time_limit=args.time_limit,
+                              method=args.method, memory=not args.no_memory)
+            record["environment"] = environment
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            timings = "，".join(f"{name} {seconds:.3f}s" for name, seconds in record["timings"].items())
+            print(f"[{i}/{len(cases)}] 宽度{n_widths}种、{raw_kind}、容忍度{record['tolerance']:g}、"
+                  f"方案数{max_patterns}：{record['pattern_counts']['generate_priced']}个方案，{timings}，"
+                  f"{record['status']}")
+    print(f"结果已写入{args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+命令行批量求解：不打开浏览器，依次求解多个按输入模板填写的订单。
+用法示例：python cli.py orders/*.xlsx --output-dir results --format xlsx --workers 4
+"""
+import argparse
+import contextlib
+import glob
+import io
+from pathlib import Path
+
+from planning import (load_order, make_raw_materials, make_cost_df, group_order, solve_order, combine_results,
+                      DEFAULT_RAW_RANGE, DEFAULT_PRICES)
+from pattern_model import BACKENDS
+from pricing import PriceTable
+from result_cache import default_result_cache
+from solve_capture import SolveCapture
+
+OUTPUT_FORMATS = ("csv", "parquet", "xlsx")
+
+
+def find_workbooks(inputs):
+    """把目录、通配符和文件路径展开为xlsx文件列表，保持顺序并去重"""
+    paths = []
+    for item in inputs:
+        path = Path(item)
+        if path.is_dir():
+            matches = sorted(path.glob("*.xlsx"))
+        else:
+            matches = [Path(match) for match in sorted(glob.glob(item))]
+        for match in matches:
+            # 跳过Excel打开文件时生成的临时文件
+            if not match.name.startswith("~$") and match not in paths:
+                paths.append(match)
+    return paths
+
+
+def write_table(table, path, output_format):
+    """按格式写出结果表，列名统一转为字符串；求解信息不写入文件"""
+    table = table.rename(columns=str)
+    table.attrs = {}
+    if output_format == "csv":
+        table.to_csv(path, index=False, encoding="utf-8-sig")  # 带BOM，Excel打开中文不乱码
+    elif output_format == "parquet":
+        table.to_parquet(path, index=False)
+    elif output_format == "xlsx":
+        table.to_excel(path, index=False, engine="openpyxl")
+    else:
+        raise ValueError(f"不支持的输出格式：{output_format}")
+
+
+def _parse_widths(text):
+    """解析以逗号分隔的原料宽度，兼容中文逗号"""
+    try:
+        return [float(width) for width in text.replace(" ", "").replace("，", ",").split(",") if width]
+    except ValueError:
+        raise argparse.ArgumentTypeError("请输入合法的原料宽度：以逗号分隔的数字")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量求解带钢裁剪方案")
+    parser.add_argument("inputs", nargs="+", help="订单文件、目录或通配符，如 orders/*.xlsx")
+    parser.add_argument("--output-dir", default="results", help="结果目录，每个订单输出一个文件")
+    parser.add_argument("--format", default="csv", choices=OUTPUT_FORMATS, help="结果文件格式")
+    raw = parser.add_mutually_exclusive_group()
+    raw.add_argument("--raw-range", type=int, nargs=2, default=DEFAULT_RAW_RANGE, metavar=("MIN", "MAX"),
+                     help="连续范围的原料宽度(mm)")
+    raw.add_argument("--discrete-widths", type=_parse_widths, help="分立的原料宽度，以逗号分隔")
+    prices = parser.add_mutually_exclusive_group()
+    prices.add_argument("--prices", type=float, nargs=2, default=DEFAULT_PRICES, metavar=("LOW", "HIGH"),
+                        help="1250mm以下和以上原料的单价(元/吨)")
+    prices.add_argument("--price-table", default=None,
+                        help="价格表文件(csv或xlsx)，列为起始宽度、单价，可选起始厚度、材质")
+    parser.add_argument("--max-patterns", type=int, default=5, help="最大裁剪方案数")
+    parser.add_argument("--tolerance", type=float, default=None, help="边丝容忍度(mm)，默认取各分组最窄的成品宽度")
+    parser.add_argument("--method", default="exhaustive", choices=["exhaustive", "column_generation"])
+    parser.add_argument("--mode", default="mip", choices=["mip", "price_and_branch", "heuristic"])
+    parser.add_argument("--backend", default="scip", choices=list(BACKENDS),
+                        help="整数规划求解器，cp_sat可以多线程并行搜索")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="每个分组求解器使用的线程数，默认cp_sat把CPU平均分给各进程")
+    parser.add_argument("--time-limit", type=float, default=None, help="单组求解时限(秒)")
+    parser.add_argument("--rel-gap", type=float, default=None, help="可接受的相对差距，如0.001")
+    parser.add_argument("--workers", type=int, default=None, help="并行求解的进程数，默认使用全部CPU")
+    parser.add_argument("--service", default=None, help="求解服务的地址，如http://127.0.0.1:8765，默认在本机求解")
+    parser.add_argument("--no-cache", action="store_true", help="不使用也不保存求解结果缓存")
+    parser.add_argument("--stats", default=None, help="把各分组的统计信息以JSON lines追加到该文件")
+    parser.add_argument("--capture-dir", default=None,
+                        help="把实际求解的各分组的输入和统计信息录制到该目录，可用python -m benchmarks.replay回放")
+    parser.add_argument("--capture-mps", action="store_true", help="录制时同时导出MPS格式的模型")
+    parser.add_argument("--verbose", action="store_true", help="显示求解过程的输出")
+    args = parser.parse_args(argv)
+
+    workbooks = find_workbooks(args.inputs)
+    if not workbooks:
+        parser.error("没有找到订单文件")
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    raw_materials = make_raw_materials(raw_range=args.raw_range, discrete_widths=args.discrete_widths)
+    if args.price_table is not None:
+        try:
+            cost_df = PriceTable.from_file(args.price_table)
+        except (OSError, ValueError) as e:
+            parser.error(f"无法读取价格表{args.price_table}：{e}")
+    else:
+        cost_df = make_cost_df(*args.prices)
+    capture = SolveCapture(args.capture_dir, export_mps=args.capture_mps) if args.capture_dir else None
+    failed = 0
+    for i, workbook in enumerate(workbooks, start=1):
+        prefix = f"[{i}/{len(workbooks)}] {workbook.name}"
+        try:
+            groups = group_order(load_order(workbook))
+            # 求解过程的输出默认不显示，只输出每个订单的汇总
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                solutions = solve_order(groups, raw_materials, cost_df, args.max_patterns,
+                                        service_url=args.service,
+                                        workers=args.workers, timeout=args.time_limit, method=args.method,
+                                        mode=args.mode, rel_gap=args.rel_gap, tolerance=args.tolerance,
+                                        backend=args.backend, threads=args.threads,
+                                        cache=None if args.no_cache else default_result_cache,
+                                        stats_path=args.stats, capture=capture)
+            table, errors = combine_results(groups, solutions)
+        except Exception as e:
+            failed += 1
+            print(f"{prefix}：读取或求解失败：{type(e).__name__}: {e}")
+            continue
+
+        for group, error in errors:
+            print(f"{prefix}：材料{group.material_type}、材质{group.grade}、厚度{group.thickness}的分组求解失败：{error}")
+        if table is None:
+            failed += 1
+            print(f"{prefix}：没有可输出的方案")
+            continue
+
+        # 每个订单求解完立即写出，中途中断也不会丢失已完成的结果
+        path = output_dir / f"{workbook.stem}.{args.format}"
+        write_table(table, path, args.format)
+        cost = table["成本"].sum()
+        weight = table["重量(吨)"].sum()
+        print(f"{prefix}：{len(groups)}组，{len(table)}个方案，重量{weight:.2f}吨，成本¥{cost:,.0f} -> {path}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
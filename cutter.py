@@ -1,16 +1,20 @@
+import streamlit as st
 from st_aggrid import AgGrid, GridOptionsBuilder, GridUpdateMode
 from support import *
 from solution import *
+from pattern_model import BACKENDS
+from pricing import PriceTable
+from result_cache import default_result_cache
+from solve_capture import SolveCapture
+from solve_service import ServiceError
+from planning import (get_density, load_order, make_raw_materials, make_cost_df, group_order, SolveJob,
+                      sweep_order, format_result, DEFAULT_RAW_RANGE, DEFAULT_PRICES)
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import os
 import plotly_express as px
 
 
-def process_uploaded_file(_uploaded_file):
-    _brackets = Brackets.from_excel(uploaded_file, re_parse=True)
-    _brackets.init_target_dimensions()
-    return _brackets.to_dataframe()
-
-
 def visualize_key_elements(_combined_df):
     st.divider()
 
@@ -67,8 +71,151 @@ def visualize_key_elements(_combined_df):
         height=600
     )
 
-def get_density(material_type):
-    return SupportBracket.DENSITY[material_type]
+def show_frontier(frontier):
+    """展示不同最大方案数和边丝容忍度下的订单总成本"""
+    frontier = frontier.rename(columns={"tolerance": "边丝容忍度(mm)", "max_patterns": "最大方案数",
+                                        "n_patterns": "使用方案数", "cost": "成本", "gap": "差距"})
+    frontier["边丝容忍度(mm)"] = frontier["边丝容忍度(mm)"].map("{:g}".format)
+    fig = px.line(frontier, x="最大方案数", y="成本", color="边丝容忍度(mm)", markers=True,
+                  hover_data=["使用方案数", "差距"])
+    fig.update_layout(xaxis={"dtick": 1})
+    st.plotly_chart(fig, use_container_width=True)
+    st.dataframe(frontier.style.format({"成本": "¥{:,.0f}", "差距": "{:.2%}"}, na_rep="无可行解"))
+
+
+def show_specification_errors(errors):
+    """逐条提示无法解析的规格，errors为parse_specifications返回的错误报告"""
+    for row in errors.itertuples():
+        st.warning(f"请检查第{row.row + 1}行的规格{row.specification}: {row.error}")
+
+
+def show_diagnostics(stats):
+    """展示一个分组的求解统计信息：各阶段用时、方案数、模型规模和求解状态"""
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("求解状态", stats.status or "-")
+    col2.metric("差距", f"{stats.gap:.2%}" if stats.gap is not None else "-")
+    col3.metric("分支节点数", stats.node_count if stats.node_count is not None else "-")
+    col4.metric("进程峰值内存", f"{stats.peak_rss_bytes / 2 ** 20:.0f} MB" if stats.peak_rss_bytes else "-",
+                help="求解进程启动以来的峰值内存，可能包括同一进程之前求解的分组和界面本身，不是本分组单独的用量")
+
+    stage_names = {"generate": "生成方案", "enumerate": "枚举组合", "price": "标价过滤",
+                   "master": "列生成主问题", "pricing": "列生成定价", "presolve": "预处理",
+                   "heuristic": "贪心初始解", "lp_bound": "LP下界", "restrict": "限制方案", "update": "更新模型",
+                   "warm_start": "上次的解", "build": "建模", "solve": "求解"}
+    count_names = {"enumerated": "枚举的组合", "priced": "标价过滤后", "columns": "列生成的方案",
+                   "presolved": "预处理后", "restricted": "先定价后分支保留"}
+    timings = pd.DataFrame({"阶段": [stage_names.get(name, name) for name in stats.timings],
+                            "用时(秒)": list(stats.timings.values())})
+    counts = pd.DataFrame({"方案": [count_names.get(name, name) for name in stats.pattern_counts],
+                           "数量": list(stats.pattern_counts.values())})
+    col1, col2 = st.columns(2)
+    col1.dataframe(timings.style.format({"用时(秒)": "{:.3f}"}), hide_index=True)
+    col2.dataframe(counts, hide_index=True)
+    details = [f"变量数：{stats.n_variables}", f"约束数：{stats.n_constraints}"]
+    if stats.cache_hit is not None:
+        details.append("方案来自缓存" if stats.cache_hit else "方案为重新枚举")
+    if stats.iterations is not None:
+        details.append(f"列生成迭代{stats.iterations}次")
+    st.caption("，".join(details))
+
+
+def progress_text(group, progress):
+    """一个分组的求解进度，progress为 (用时, 当前最好成本, 成本下界)，尚未开始时为None"""
+    text = f"{group.material_type}、{group.grade}、{group.thickness}mm："
+    if progress is None:
+        return text + "等待求解"
+    elapsed, incumbent, bound = progress
+    # 目标函数为 单价 × 宽度(mm) × 长度(mm)，换算成元
+    to_yuan = group.thickness * get_density(group.material_type) / 1e9
+    text += f"已用时{elapsed:.1f}秒"
+    if incumbent is not None:
+        text += f"，当前最好成本¥{incumbent * to_yuan:,.0f}"
+    if bound is not None:
+        text += f"，理论下界¥{bound * to_yuan:,.0f}"
+    return text
+
+
+def show_group_result(group, group_index, result, error):
+    """展示一个分组的裁剪方案和诊断信息，返回用于汇总的表格；求解失败时返回None"""
+    grade, thick, material = group.grade, group.thickness, group.material_type
+    if error is not None:
+        st.warning(f"材料{material}、材质{grade}、厚度{thick}的分组求解失败：{error}")
+    if result is None:
+        return None
+
+    # 处理求解结果
+    table = format_result(result, group)
+
+    # 在下拉框里展示每一个分组的信息
+    with st.expander(f"# 第{group_index}组: 材料： {material}、材质：{grade}、厚度：{thick}", expanded=True):
+        # 用无序列表展示该分组包含的成品
+        st.markdown(f"**包含成品:**")
+        for _, row in group.items.iterrows():
+            escaped_spec = row['specification_t'].replace("*", "\\*")
+            st.markdown(
+                f"- {row['name']}：材质{row['grade']}, 规格{escaped_spec}, 展开宽度{row['unfolded_width']}")
+        st.markdown("**裁剪方案：**")
+        if result.attrs.get("status") not in (None, "OPTIMAL"):
+            if result.attrs.get("gap") is not None:
+                st.caption(f"未证明最优：成本最多比最优方案高{result.attrs['gap']:.2%}")
+            else:  # 求解器在算出下界之前就停止了
+                st.caption("未证明最优：求解器没有给出下界，与最优方案的差距未知")
+        # 展示该分组的裁剪方案
+        styled_df = table.style.format({
+            "使用长度(m)": "{:.1f}",
+            "重量(吨)": "{:.3f}",
+            "原料利用率": "{:.1%}",
+            "单价(元/吨)": "{:.0f}",
+            "成本": "{:.02f}",
+            **{w: "{:.0f}" for w in group.products.width.unique()}  # 成品数量整数显示
+        })
+        st.dataframe(styled_df)
+
+    # 统计信息放在单独的下拉框里，默认收起
+    if result.attrs.get("stats") is not None:
+        with st.expander(f"🔍 第{group_index}组诊断信息"):
+            show_diagnostics(result.attrs["stats"])
+
+    # 记录分组信息
+    table["分组描述"] = group.describe(group_index)
+    return table
+
+
+def show_solve_job(job):
+    """展示后台求解的进度和已完成分组的结果，全部完成后展示汇总"""
+    if job.error is not None:
+        if isinstance(job.error, ServiceError):
+            st.error(f"求解服务出错：{job.error}")
+        else:  # 如价格表中没有某个分组的价格
+            st.error(str(job.error))
+        return
+
+    # 分组按订单中的顺序编号，先完成的分组先展示
+    all_results = []
+    for group_index, (group, outcome) in enumerate(zip(job.groups, job.results), start=1):
+        if outcome is None:
+            st.caption(progress_text(group, job.progress[group_index - 1]))
+            continue
+        table = show_group_result(group, group_index, *outcome)
+        if table is not None:
+            all_results.append(table)
+
+    # 全局结果分析
+    if job.done and all_results:
+        combined_df = pd.concat(all_results).reset_index(drop=True)
+        visualize_key_elements(combined_df)
+
+
+@st.fragment(run_every=1)
+def show_running_job(job):
+    """求解过程中每秒只刷新这一部分，页面上的其他操作不受影响；全部完成后整页重新运行一次"""
+    if job.done:
+        st.rerun()
+    if job.cancelled:
+        st.caption("正在取消，等待求解器返回当前最好的方案...")
+    elif st.button("⏹ 取消求解", help="正在求解的分组返回当前最好的方案，尚未开始的分组不再求解"):
+        job.cancel()
+    show_solve_job(job)
 
 
 # 主程序
@@ -128,7 +275,40 @@ if not uploaded_file:
 # 求解参数设置
 with st.sidebar.expander(label="⚙️ 求解参数设置", expanded=True):
     config = {"max_patterns": st.slider("最大裁剪方案数", 1, 10, 5),
-              "trim_tolerance": st.slider("边丝容忍度(mm)", 0, 150, 50)}
+              "trim_tolerance": st.slider("边丝容忍度(mm)", 1, 150, 50),
+              "method": st.radio("求解方式",
+                                 ["exhaustive", "column_generation"],
+                                 format_func={"exhaustive": "枚举全部方案",
+                                              "column_generation": "列生成"}.get,
+                                 help="成品宽度种类较多时，列生成只生成有用的方案，求解更快"),
+              "mode": st.radio("求解模式",
+                               ["mip", "price_and_branch", "heuristic"],
+                               format_func={"mip": "精确求解",
+                                            "price_and_branch": "快速求解",
+                                            "heuristic": "快速报价"}.get,
+                               help="快速求解只在LP松弛中有用的方案上求解整数规划；"
+                                    "快速报价用贪心算法在毫秒级给出方案；两者都显示与理论下界的差距"),
+              "backend": st.radio("求解器",
+                                  list(BACKENDS),
+                                  format_func=lambda backend: BACKENDS[backend].name,
+                                  help="CP-SAT用多个线程并行搜索，使用长度取整数毫米"),
+              "threads": st.number_input("求解线程数(0为自动)", 0, os.cpu_count() or 1, 0,
+                                         help="每个分组求解器使用的线程数") or None,
+              "time_limit": st.number_input("单组求解时限(秒)", 1, 600, 60,
+                                            help="到时返回当前最好的方案，并显示与理论下界的差距"),
+              "rel_gap": st.number_input("可接受差距(%)", 0.0, 10.0, 0.01, step=0.01, format="%.2f",
+                                         help="方案成本与理论下界的差距小于该值即停止求解") / 100}
+
+# 权衡分析：比较不同的最大方案数和边丝容忍度
+with st.sidebar.expander(label="📈 方案数与容忍度权衡", expanded=False):
+    config["sweep_max_patterns"] = st.slider("比较的最大方案数", 1, 10, (1, config["max_patterns"]))
+    sweep_tolerances = st.text_input("比较的边丝容忍度(mm)，以逗号分隔", "20,50,100")
+    try:
+        config["sweep_tolerances"] = [float(tolerance) for tolerance in
+                                      sweep_tolerances.replace(" ", "").replace("，", ",").split(",") if tolerance]
+    except ValueError:
+        st.warning("请输入合法的边丝容忍度：以逗号分隔的数字")
+        st.stop()
 
 # 原料参数
 discrete_widths = None  # widths在选择分立宽度时被设定
@@ -137,7 +317,7 @@ with st.sidebar.expander(label="⚙️ 原料设定", expanded=True):
                                   ["连续范围", "分立宽度"],
                                   help="选择使用连续范围的原料还是指定具体宽度")
     if config["raw_type"] == "连续范围":
-        config["raw_range"] = st.slider("原料宽度范围(mm)", 1000, 1300, (1000, 1300))
+        config["raw_range"] = st.slider("原料宽度范围(mm)", 1000, 1300, DEFAULT_RAW_RANGE)
         st.write(f"原料宽度范围为：{config['raw_range']}")
     elif config["raw_type"] == "分立宽度":
         raw_discrete = st.text_input("输入原料宽度，以逗号分隔")
@@ -157,13 +337,24 @@ with st.sidebar.expander(label="⚙️ 原料设定", expanded=True):
                     st.stop()
             st.write(f"原料宽度为：{discrete_widths}")
 with st.sidebar.expander(label="⚙️ 原料价格设定", expanded=True):
-    config["price_1000_1249"] = st.number_input("1200mm以下单价(元/吨)", 3000, 5000, 3460)
-    config["price_1250plus"] = st.number_input("1200mm以上单价(元/吨)", 3000, 5000, 3410)
+    config["price_1000_1249"] = st.number_input("1200mm以下单价(元/吨)", 3000, 5000, DEFAULT_PRICES[0])
+    config["price_1250plus"] = st.number_input("1200mm以上单价(元/吨)", 3000, 5000, DEFAULT_PRICES[1])
+    price_file = st.file_uploader("或上传价格表", type=["xlsx", "csv"],
+                                  help="列为起始宽度、单价，可选起始厚度、材质；上传后不使用上面的两档价格")
+    if price_file:
+        try:
+            config["price_table"] = PriceTable.from_file(price_file)
+        except ValueError as e:
+            st.warning(f"请检查价格表：{e}")
+            st.stop()
 
 if uploaded_file:
     # 解析
-    df = process_uploaded_file(uploaded_file)
-    df["density"] = df["material_type"].apply(get_density)
+    try:
+        df = load_order(uploaded_file)
+    except SpecificationError as e:
+        show_specification_errors(e.errors)
+        st.stop()
 
     # 选定需要展示的列, 并翻译
     columns_to_display = ["name", "material_type", "density", "grade", "specification", "specification_t", "count",
@@ -185,7 +376,10 @@ if uploaded_file:
                            update_mode=GridUpdateMode.VALUE_CHANGED  # 仅在数值变化时重新渲染
                            )
 
-    if st.button("🚀 应用修改并求解", type="primary"):
+    col_solve, col_sweep = st.columns(2)
+    solve_clicked = col_solve.button("🚀 应用修改并求解", type="primary")
+    sweep_clicked = col_sweep.button("📈 比较方案数与容忍度", help="参数在侧边栏的“方案数与容忍度权衡”中设置")
+    if solve_clicked or sweep_clicked:
         # 获取编辑后的 DataFrame
         updated_df = display_in_English(grid_response['data'])  # 将中文列名转换回英文列名
 
@@ -194,92 +388,76 @@ if uploaded_file:
 
         # 更新目标规格字段
         brackets.update_target_dimensions()  # 确保所有 SupportBracket 对象的目标规格都得到更新
+        if not brackets.errors.empty:
+            show_specification_errors(brackets.errors)
+            st.stop()
 
         # 再利用更新的brackets更新updated_df
         updated_df = brackets.to_dataframe()
 
-        # 存储整体结果
-        all_results = []
-        分组描述s = []
-
-        # 准备参数，raw_materials
+        # 准备参数，raw_materials和cost_df
         if config["raw_type"] == "连续范围":
-            r_widths = range(config["raw_range"][0], config["raw_range"][1] + 1)
+            raw_materials = make_raw_materials(raw_range=config["raw_range"])
         elif config["raw_type"] == "分立宽度":
-            r_widths = config["discrete_widths"]
-        raw_materials = pd.DataFrame(data=r_widths, columns=['width'])
-        raw_materials = raw_materials.sort_values(by="width",ignore_index=True)
-
-        # 准备参数，cost_df
-        cost_df = pd.DataFrame({"start_width": [1000, 1250],
-                                "cost": [config["price_1000_1249"], config["price_1250plus"] ]})
-
+            raw_materials = make_raw_materials(discrete_widths=config["discrete_widths"])
+        cost_df = config.get("price_table")
+        if cost_df is None:
+            cost_df = make_cost_df(config["price_1000_1249"], config["price_1250plus"])
 
         # 按目标厚度和材质分组
-        grouped = updated_df.groupby(["grade", "thickness_t", "material_type"])
-        group_index = 1
-        for (grade, thick, material), group in grouped:
-            group["total_length"] = group["count"] * group["length"]
-            products = group[["unfolded_width", "total_length"]].rename(columns={"unfolded_width": "width"})
-            products = products.groupby("width").sum().reset_index()
-            # 对每组求解
-            sol = Solution(raw_materials=raw_materials,
-                           products=products,
-                           cost_df=cost_df)
-            result = sol.solve(max_patterns=config["max_patterns"])
-
-            if result is not None:
-                # 处理求解结果
-                result = display_in_Chinese(result)
-                result["使用长度(m)"] = result["使用长度(mm)"] / 1000
-                result["重量(吨)"] = (
-                        result["使用长度(m)"] * result["原料宽度(mm)"] * thick
-                        / 1e6 * get_density(material))
-                result["原料利用率"] = (1 - result["边丝宽度(mm)"] / result["原料宽度(mm)"])
-                col_in_order = (["原料宽度(mm)", "使用长度(m)", "重量(吨)", "原料利用率"] +
-                                [column for column in result.columns if isinstance(column, float)])
-                result = result[col_in_order]
-
-                # 在下拉框里展示每一个分组的信息
-                with st.expander(f"# 第{group_index}组: 材料： {material}、材质：{grade}、厚度：{thick}",
-                                 expanded=True):
-                    # 用无序列表展示该分组包含的成品
-                    st.markdown(f"**包含成品:**")
-                    for _, row in group.iterrows():
-                        escaped_spec = row['specification_t'].replace("*", "\\*")
-                        st.markdown(
-                            f"- {row['name']}：材质{row['grade']}, 规格{escaped_spec}, 展开宽度{row['unfolded_width']}")
-                    st.markdown("**裁剪方案：**")
-                    # 展示该分组的裁剪方案
-                    # 在生成result时添加单价列
-                    result["单价(元/吨)"] = result["原料宽度(mm)"].map(lambda w:
-                                                                    config["price_1000_1249"] if w < 1250 else config[
-                                                                        "price_1250plus"]
-                                                                    )
-
-                    # 计算每个方案的成本
-                    result["成本"] = result["重量(吨)"] * result["单价(元/吨)"]
-                    styled_df = result.style.format({
-                        "使用长度(m)": "{:.1f}",
-                        "重量(吨)": "{:.3f}",
-                        "原料利用率": "{:.1%}",
-                        "成本": "{:.02f}",
-                        **{str(w): "{:.0f}" for w in products.width.unique()}  # 成品数量整数显示
-                    })
-                    st.dataframe(styled_df)
-
-                # 记录分组信息
-                description_text = f'第{group_index}组 ({material}, {grade}, {thick}mm)'
-                result["分组描述"] = description_text
-                分组描述s.append({"分组描述": description_text,
-                                           "products": group})
-                all_results.append(result)
-
-                group_index += 1
-
-        # 全局结果分析
-        combined_df = pd.concat(all_results)
-        combined_df = combined_df.reset_index(drop=True)
-
-        # 数据可视化
-        visualize_key_elements(combined_df)
+        groups = group_order(updated_df)
+
+        if sweep_clicked:
+            if not config["sweep_tolerances"]:
+                st.warning("请输入至少一个边丝容忍度")
+                st.stop()
+            low, high = config["sweep_max_patterns"]
+            with st.spinner("比较中..."):
+                try:
+                    frontier = sweep_order(groups, raw_materials, cost_df, range(low, high + 1),
+                                           config["sweep_tolerances"], method=config["method"],
+                                           mode=config["mode"], time_limit=config["time_limit"],
+                                           rel_gap=config["rel_gap"], backend=config["backend"],
+                                           threads=config["threads"])
+                except ValueError as e:
+                    st.error(str(e))
+                    st.stop()
+            show_frontier(frontier)
+            st.stop()
+
+        # 设置了COILCUTTER_CAPTURE_DIR时录制各分组的求解实例，求解变慢时可以原样复现
+        capture_dir = os.environ.get("COILCUTTER_CAPTURE_DIR")
+        capture = SolveCapture(capture_dir) if capture_dir else None
+
+        # 各分组相互独立，在会话的后台线程中用进程池并行求解，页面不必等待求解完成；
+        # 输入没有变化的分组直接使用上次的结果。重新求解时取消上一次尚未完成的求解
+        previous_job = st.session_state.get("solve_job")
+        if previous_job is not None and not previous_job.done:
+            previous_job.cancel()
+        if "solve_executor" not in st.session_state:
+            st.session_state["solve_executor"] = ThreadPoolExecutor(max_workers=1)
+        # 设置了COILCUTTER_SOLVE_SERVICE时提交给本机求解服务，多个会话共用固定数量的求解进程
+        st.session_state["solve_job"] = SolveJob(groups,
+                                                 raw_materials=raw_materials,
+                                                 cost_df=cost_df,
+                                                 max_patterns=config["max_patterns"],
+                                                 executor=st.session_state["solve_executor"],
+                                                 service_url=os.environ.get("COILCUTTER_SOLVE_SERVICE"),
+                                                 timeout=config["time_limit"],
+                                                 method=config["method"],
+                                                 mode=config["mode"],
+                                                 rel_gap=config["rel_gap"],
+                                                 tolerance=config["trim_tolerance"],
+                                                 backend=config["backend"],
+                                                 threads=config["threads"],
+                                                 cache=default_result_cache,
+                                                 stats_path=os.environ.get("COILCUTTER_STATS_PATH"),
+                                                 capture=capture)
+
+    # 求解的进度和结果保存在会话中，调整参数等操作重新运行脚本时不会中断求解，也不会丢失结果
+    solve_job = st.session_state.get("solve_job")
+    if solve_job is not None:
+        if solve_job.done:
+            show_solve_job(solve_job)
+        else:
+            show_running_job(solve_job)
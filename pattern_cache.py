@@ -0,0 +1,130 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+class PatternCache:
+    """
+    裁剪方案缓存：进程内LRU + 磁盘上的压缩npz文件。
+    方案只取决于成品宽度、原料宽度和边丝容忍度，与需求量、材质、价格无关，
+    因此可以在不同分组、不同会话以及不同进程之间共享。
+    """
+    # 缓存格式变化时修改版本号，使旧文件失效
+    VERSION = "1"
+
+    def __init__(self, cache_dir=None, max_memory_bytes=256 * 2 ** 20, max_disk_bytes=1024 * 2 ** 20):
+        """
+        :param cache_dir: 磁盘缓存目录，None表示只使用进程内缓存
+        :param max_memory_bytes: 进程内缓存的最大字节数，超过后淘汰最久未使用的
+        :param max_disk_bytes: 磁盘缓存的最大字节数，超过后删除最久未使用的文件
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(widths, raw_widths, tolerance):
+        """
+        :param widths: 成品宽度（放大后的整数），顺序与方案矩阵的列一致
+        :param raw_widths: 原料宽度（放大后的整数）
+        :param tolerance: 边丝容忍度（放大后的整数）
+        """
+        digest = hashlib.sha1(PatternCache.VERSION.encode())
+        digest.update(np.asarray(widths, dtype=np.int64).tobytes())
+        digest.update(b"|")
+        digest.update(np.unique(np.asarray(raw_widths, dtype=np.int64)).tobytes())
+        digest.update(b"|")
+        digest.update(np.int64(tolerance).tobytes())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.npz"
+
+    def get(self, key):
+        """命中时返回方案矩阵，否则返回None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                counts = data["counts"]
+            os.utime(path)  # 更新访问时间，供淘汰时参考
+        except (OSError, ValueError, KeyError):
+            return None
+        self._remember(key, counts)
+        return counts
+
+    def put(self, key, counts):
+        self._remember(key, counts)
+        if self.cache_dir is None:
+            return
+
+        # 先写临时文件再改名，多个进程同时写入也不会读到不完整的文件
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, counts=counts)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict_disk()
+
+    def _remember(self, key, counts):
+        counts.setflags(write=False)  # 缓存中的矩阵被多处共享，禁止修改
+        with self._lock:
+            if key in self._memory:
+                self._memory_bytes -= self._memory.pop(key).nbytes
+            self._memory[key] = counts
+            self._memory_bytes += counts.nbytes
+            while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted.nbytes
+
+    def _evict_disk(self):
+        """按最近使用时间从旧到新删除，直到磁盘占用不超过上限"""
+        files = []
+        for path in self.cache_dir.glob("*.npz"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if self.cache_dir is not None:
+            for path in self.cache_dir.glob("*.npz"):
+                path.unlink(missing_ok=True)
+
+
+# 默认缓存，目录可用环境变量COILCUTTER_CACHE_DIR指定
+default_cache = PatternCache(
+    cache_dir=os.environ.get("COILCUTTER_CACHE_DIR",
+                             Path.home() / ".cache" / "coilcutter" / "patterns"))
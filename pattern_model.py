@@ -0,0 +1,336 @@
+import threading
+import time
+
+import numpy as np
+from ortools.math_opt import (callback_pb2, model_parameters_pb2, model_pb2, parameters_pb2, result_pb2,
+                              solution_pb2)
+from ortools.linear_solver import linear_solver_pb2, pywraplp
+from ortools.math_opt.core.python import solver as mathopt_solver
+
+SOLVER_TYPES = {"SCIP": parameters_pb2.SOLVER_TYPE_GSCIP,
+                "CP_SAT": parameters_pb2.SOLVER_TYPE_CP_SAT,
+                "GLOP": parameters_pb2.SOLVER_TYPE_GLOP}
+# 各求解器支持的回调事件，CP-SAT没有分支定界节点事件
+CALLBACK_EVENTS = {"SCIP": [callback_pb2.CALLBACK_EVENT_MIP_SOLUTION, callback_pb2.CALLBACK_EVENT_MIP_NODE],
+                   "CP_SAT": [callback_pb2.CALLBACK_EVENT_MIP_SOLUTION]}
+# 回调中给出mip_stats（当前最好成本和下界）和用时的求解器，其他求解器只能从回调中的可行解计算成本。
+# mip_stats只在分支定界节点事件中是完整的，可行解事件中可能全为0，因此成本总是由可行解计算
+MIP_STATS_SOLVERS = {"SCIP"}
+
+
+def known_bound(bound):
+    """各方案的成本都为正，下界不大于0说明求解器还没有算出有意义的下界，视为未知（None）"""
+    return bound if np.isfinite(bound) and bound > 0 else None
+
+
+class SolverBackend:
+    """整数规划的求解后端：使用的求解器，以及模型需要为它做的调整"""
+
+    def __init__(self, name, solver, integer_lengths=False):
+        """
+        :param name: 展示用的名称
+        :param solver: SOLVER_TYPES中的求解器
+        :param integer_lengths: 使用长度是否取整数（mm），CP-SAT只能求解整数变量
+        """
+        self.name = name
+        self.solver = solver
+        self.integer_lengths = integer_lengths
+
+
+BACKENDS = {"scip": SolverBackend("SCIP", "SCIP"),
+            "cp_sat": SolverBackend("CP-SAT", "CP_SAT", integer_lengths=True)}
+
+
+def get_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(f"不支持的求解器：{backend}")
+    return BACKENDS[backend]
+
+
+class ModelResult:
+    """一次求解的结果"""
+
+    def __init__(self, status, objective_value=None, best_bound=None, len_used=None,
+                 node_count=0, solve_time=0.0, reduced_costs=None):
+        """
+        :param status: 终止状态，如OPTIMAL、FEASIBLE、NO_SOLUTION_FOUND、INFEASIBLE
+        :param objective_value: 最好可行解的成本，没有可行解时为None
+        :param best_bound: 成本下界
+        :param len_used: 每个方案的使用长度（np.ndarray），没有可行解时为None
+        :param node_count: 分支定界的节点数
+        :param solve_time: 求解用时（秒）
+        :param reduced_costs: LP松弛中每个方案的检验数（np.ndarray），见PatternModel.solve；整数规划时为None
+        """
+        self.status = status
+        self.objective_value = objective_value
+        self.best_bound = best_bound
+        self.len_used = len_used
+        self.node_count = node_count
+        self.solve_time = solve_time
+        self.reduced_costs = reduced_costs
+
+    @property
+    def gap(self):
+        """可行解成本与下界的相对差距"""
+        if self.objective_value is None or self.best_bound is None or not np.isfinite(self.best_bound):
+            return None
+        if self.objective_value == 0:
+            return 0.0
+        return max(self.objective_value - self.best_bound, 0) / abs(self.objective_value)
+
+
+class PatternModel:
+    """
+    裁剪方案的整数规划模型，直接用数组生成MathOpt的ModelProto。
+    变量：前n_patterns个为各方案的使用长度l，后n_patterns个为使用标记y。
+    约束：各成品总长度满足需求、使用的方案数不超过max_patterns、l <= M * y。
+    """
+    # 成本和下界没有变化时，求解过程中调用progress的最长间隔（秒），使界面上的用时及时更新
+    PROGRESS_INTERVAL = 0.5
+    # 检查cancel的间隔（秒）
+    CANCEL_POLL_INTERVAL = 0.1
+
+    def __init__(self, counts, costs, demands, max_patterns, big_m, integer=True, integer_lengths=False):
+        """
+        :param counts: 方案数量矩阵，形状为(方案数, 成品数)
+        :param costs: 每个方案单位长度的成本
+        :param demands: 每种成品需要的总长度
+        :param max_patterns: 最多使用的方案数
+        :param big_m: 每个方案的长度上限
+        :param integer: False时y为连续变量，即LP松弛
+        :param integer_lengths: 使用长度l也取整数（mm），长度上限向上取整
+        """
+        n_patterns, n_products = counts.shape
+        self.n_patterns = n_patterns
+        self.n_products = n_products
+        self.integer = integer
+        self.integer_lengths = integer_lengths
+        big_m = self._round_big_m(big_m)
+        self.big_m = big_m
+        self.costs = np.asarray(costs, dtype=float)
+        proto = model_pb2.ModelProto()
+
+        # 定义变量
+        proto.variables.ids.extend(range(2 * n_patterns))
+        proto.variables.lower_bounds.extend(np.zeros(2 * n_patterns).tolist())
+        proto.variables.upper_bounds.extend(np.concatenate([big_m, np.ones(n_patterns)]).tolist())
+        proto.variables.integers.extend([integer_lengths] * n_patterns + [integer] * n_patterns)
+
+        # 定义目标函数：使用原材料的价值最小
+        proto.objective.linear_coefficients.ids.extend(range(n_patterns))
+        proto.objective.linear_coefficients.values.extend(np.asarray(costs, dtype=float).tolist())
+
+        # 约束：各成品需求、方案数上限、l - M * y <= 0
+        proto.linear_constraints.ids.extend(range(n_products + 1 + n_patterns))
+        proto.linear_constraints.lower_bounds.extend(
+            np.concatenate([demands, [0], np.full(n_patterns, -np.inf)]).tolist())
+        proto.linear_constraints.upper_bounds.extend(
+            np.concatenate([np.full(n_products, np.inf), [max_patterns], np.zeros(n_patterns)]).tolist())
+
+        # 约束矩阵只包含非零系数，按(行, 列)排序
+        product_ids, pattern_ids = np.nonzero(counts.T)
+        patterns = np.arange(n_patterns)
+        rows = np.concatenate([product_ids,
+                               np.full(n_patterns, n_products),
+                               np.repeat(patterns + n_products + 1, 2)])
+        columns = np.concatenate([pattern_ids,
+                                  patterns + n_patterns,
+                                  np.stack([patterns, patterns + n_patterns], axis=1).ravel()])
+        coefficients = np.concatenate([counts[pattern_ids, product_ids],
+                                       np.ones(n_patterns),
+                                       np.stack([np.ones(n_patterns), -np.asarray(big_m, dtype=float)],
+                                                axis=1).ravel()])
+        order = np.lexsort((columns, rows))
+        matrix = proto.linear_constraint_matrix
+        matrix.row_ids.extend(rows[order].tolist())
+        matrix.column_ids.extend(columns[order].tolist())
+        matrix.coefficients.extend(coefficients[order].tolist())
+        self.proto = proto
+        # 每个方案的 -M 系数在排序后的约束矩阵中的位置，修改需求时原地更新
+        positions = np.empty(len(order), dtype=np.int64)
+        positions[order] = np.arange(len(order))
+        self._big_m_positions = positions[len(product_ids) + n_patterns + 2 * patterns + 1]
+
+    def _round_big_m(self, big_m):
+        big_m = np.asarray(big_m, dtype=float)
+        return np.ceil(big_m - 1e-9) if self.integer_lengths else big_m
+
+    def set_max_patterns(self, max_patterns):
+        """修改方案数上限，其余部分不变，用于在同一组方案上依次求解不同的方案数"""
+        self.proto.linear_constraints.upper_bounds[self.n_products] = max_patterns
+
+    def set_demands(self, demands, big_m):
+        """
+        原地修改各成品的需求，以及随之变化的长度上限和大M，方案不变
+        :param demands: 每种成品需要的总长度
+        :param big_m: 每个方案新的长度上限
+        """
+        big_m = self._round_big_m(big_m)
+        self.big_m = big_m
+        self.proto.linear_constraints.lower_bounds[:self.n_products] = np.asarray(demands, dtype=float).tolist()
+        self.proto.variables.upper_bounds[:self.n_patterns] = big_m.tolist()
+        coefficients = np.asarray(self.proto.linear_constraint_matrix.coefficients)
+        coefficients[self._big_m_positions] = -big_m
+        self.proto.linear_constraint_matrix.coefficients[:] = coefficients.tolist()
+
+    def set_costs(self, costs):
+        """原地修改每个方案单位长度的成本"""
+        self.costs = np.asarray(costs, dtype=float)
+        self.proto.objective.linear_coefficients.values[:] = self.costs.tolist()
+
+    def to_mps(self):
+        """
+        导出为MPS格式的文本，便于用其他求解器或命令行工具复现。
+        变量l_i、y_i为第i个方案的使用长度和使用标记，约束demand_j、max_patterns、link_i与模型一致。
+        """
+        proto = self.proto
+        model = linear_solver_pb2.MPModelProto()
+        objective = np.zeros(2 * self.n_patterns)
+        objective[np.asarray(proto.objective.linear_coefficients.ids, dtype=int)] = \
+            proto.objective.linear_coefficients.values
+        names = [f"l_{i}" for i in range(self.n_patterns)] + [f"y_{i}" for i in range(self.n_patterns)]
+        for name, lower, upper, integer, cost in zip(names, proto.variables.lower_bounds,
+                                                     proto.variables.upper_bounds, proto.variables.integers,
+                                                     objective.tolist()):
+            model.variable.add(name=name, lower_bound=lower, upper_bound=upper, is_integer=integer,
+                               objective_coefficient=cost)
+
+        names = ([f"demand_{j}" for j in range(self.n_products)] + ["max_patterns"]
+                 + [f"link_{i}" for i in range(self.n_patterns)])
+        matrix = proto.linear_constraint_matrix
+        rows = np.asarray(matrix.row_ids, dtype=int)
+        columns, coefficients = list(matrix.column_ids), list(matrix.coefficients)
+        # 约束矩阵按行排序，每行的系数是连续的一段
+        starts = np.searchsorted(rows, np.arange(len(names) + 1)).tolist()
+        for row, (name, lower, upper) in enumerate(zip(names, proto.linear_constraints.lower_bounds,
+                                                        proto.linear_constraints.upper_bounds)):
+            model.constraint.add(name=name, lower_bound=lower, upper_bound=upper,
+                                 var_index=columns[starts[row]:starts[row + 1]],
+                                 coefficient=coefficients[starts[row]:starts[row + 1]])
+
+        solver = pywraplp.Solver.CreateSolver("GLOP")  # 只用于导出，不求解
+        error = solver.LoadModelFromProtoKeepNames(model)
+        if error:
+            raise ValueError(f"无法导出模型：{error}")
+        return solver.ExportModelAsMpsFormat(fixed_format=False, obfuscated=False)
+
+    @property
+    def n_variables(self):
+        return len(self.proto.variables.ids)
+
+    @property
+    def n_constraints(self):
+        return len(self.proto.linear_constraints.ids)
+
+    def solve(self, solver="SCIP", time_limit=None, rel_gap=None, hint=None, progress=None, threads=None,
+              cancel=None):
+        """
+        :param solver: "SCIP"、"CP_SAT"（需要integer_lengths）或"GLOP"（只能求解LP松弛）
+        :param time_limit: 最长求解时间（秒），None表示不限制
+        :param rel_gap: 达到该相对差距即停止，None表示使用求解器默认值
+        :param hint: 每个方案的使用长度，作为初始解提示
+        :param progress: 回调函数 progress(用时, 当前最好成本, 成本下界)，返回True时提前停止
+        :param threads: 求解器使用的线程数，None表示使用求解器的默认值
+        :param cancel: threading.Event或Manager().Event()，设置后中断求解器，返回当前最好的可行解。
+                       与progress返回True不同，预处理等没有回调的阶段也能及时停止
+        :return: ModelResult；LP松弛时还给出每个方案的检验数：l和y按l = M * y同时增加一个单位长度时
+                 目标函数的变化，即 成本 - 成品需求的对偶价格 - 方案数上限的对偶价格 / M
+        """
+        params = parameters_pb2.SolveParametersProto()
+        if threads is not None:
+            params.threads = threads
+        if time_limit is not None:
+            params.time_limit.FromNanoseconds(int(max(time_limit, 0) * 1e9))
+        if rel_gap is not None:
+            params.relative_gap_tolerance = rel_gap
+        if solver == "SCIP":
+            # locks启发式在根节点LP之前求解子问题，其间既不检查中断也没有回调，大模型上要十几秒才能停止
+            params.gscip.int_params["heuristics/locks/freq"] = -1
+
+        model_params = model_parameters_pb2.ModelSolveParametersProto()
+        if hint is not None and self.integer:
+            if self.integer_lengths:
+                hint = np.ceil(hint - 1e-6)
+            solution_hint = model_params.solution_hints.add()
+            solution_hint.variable_values.ids.extend(range(2 * self.n_patterns))
+            solution_hint.variable_values.values.extend(
+                np.concatenate([hint, (hint >= 1e-6).astype(float)]).tolist())
+
+        registration = callback_pb2.CallbackRegistrationProto()
+        callback = None
+        if progress is not None and self.integer:
+            registration.request_registration.extend(CALLBACK_EVENTS[solver])
+            last = {"report": None, "incumbent": np.inf, "bound": -np.inf, "elapsed": 0.0}
+
+            def report_progress(data):
+                if solver in MIP_STATS_SOLVERS:
+                    elapsed = data.runtime.ToTimedelta().total_seconds()
+                else:
+                    elapsed = time.perf_counter() - start
+                if data.event == callback_pb2.CALLBACK_EVENT_MIP_NODE:
+                    last["incumbent"] = min(last["incumbent"], data.mip_stats.primal_bound)
+                    last["bound"] = max(last["bound"], data.mip_stats.dual_bound)
+                else:
+                    solution = data.primal_solution_vector
+                    ids = np.asarray(solution.ids, dtype=int)
+                    is_length = ids < self.n_patterns
+                    if is_length.any():
+                        value = self.costs[ids[is_length]].dot(np.asarray(solution.values)[is_length])
+                        last["incumbent"] = min(last["incumbent"], value)
+                report = (last["incumbent"], last["bound"])
+                stop = False
+                # 成本或下界变化时报告；没有变化时也定时报告，使调用方能及时停止求解
+                if report != last["report"] or elapsed - last["elapsed"] >= self.PROGRESS_INTERVAL:
+                    last["report"], last["elapsed"] = report, elapsed
+                    incumbent = report[0] if np.isfinite(report[0]) else None
+                    bound = known_bound(report[1])
+                    stop = bool(progress(elapsed, incumbent, bound))
+                return callback_pb2.CallbackResultProto(terminate=stop)
+
+            callback = report_progress
+
+        interrupter, finished = None, threading.Event()
+        if cancel is not None:
+            interrupter = mathopt_solver.SolveInterrupter()
+
+            def watch():
+                while not cancel.is_set():
+                    if finished.wait(self.CANCEL_POLL_INTERVAL):
+                        return
+                interrupter.interrupt()
+
+            threading.Thread(target=watch, daemon=True).start()
+
+        start = time.perf_counter()
+        try:
+            response = mathopt_solver.solve(self.proto, SOLVER_TYPES[solver],
+                                            parameters_pb2.SolverInitializerProto(), params, model_params,
+                                            None, registration, callback, interrupter)
+        finally:
+            finished.set()
+        solve_time = time.perf_counter() - start
+
+        status = result_pb2.TerminationReasonProto.Name(response.termination.reason).replace(
+            "TERMINATION_REASON_", "")
+        bound = response.termination.objective_bounds.dual_bound
+        result = ModelResult(status, best_bound=known_bound(bound),
+                             node_count=response.solve_stats.node_count, solve_time=solve_time)
+        for solution in response.solutions:
+            primal = solution.primal_solution
+            if primal.feasibility_status == solution_pb2.SOLUTION_STATUS_FEASIBLE:
+                values = np.zeros(2 * self.n_patterns)
+                values[np.asarray(primal.variable_values.ids, dtype=int)] = primal.variable_values.values
+                result.objective_value = primal.objective_value
+                result.len_used = values[:self.n_patterns]
+                break
+        if not self.integer:
+            for solution in response.solutions:
+                dual = solution.dual_solution
+                if dual.feasibility_status == solution_pb2.SOLUTION_STATUS_FEASIBLE:
+                    values = np.zeros(2 * self.n_patterns)
+                    values[np.asarray(dual.reduced_costs.ids, dtype=int)] = dual.reduced_costs.values
+                    # l和y的检验数中l - M * y <= 0约束的对偶价格恰好抵消
+                    result.reduced_costs = values[:self.n_patterns] + values[self.n_patterns:] / np.maximum(
+                        self.big_m, 1e-9)
+                    break
+        return result
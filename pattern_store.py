@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+# 宽度放大为整数（0.01mm）后再做枚举、背包等精确计算
+WIDTH_SCALE = 100
+
+
+def scale_widths(widths):
+    """把以mm为单位的宽度放大为整数"""
+    return np.round(np.asarray(widths, dtype=float) * WIDTH_SCALE).astype(np.int64)
+
+
+def small_uint_dtype(max_value):
+    """能存下max_value的最小无符号整数类型"""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return dtype
+    return np.uint64
+
+
+class PatternStore:
+    """
+    紧凑存储的一组裁剪方案：各成品数量为uint8/uint16的二维数组，原料宽度、边丝宽度和单价各为一个向量。
+    去重和筛选用行哈希在线性时间内完成，只在返回结果或展示时才用to_frame转换为DataFrame。
+    """
+
+    def __init__(self, widths, counts, raw_width, trim_width, cost, ids=None):
+        """
+        :param widths: 成品宽度（mm），与counts的列一一对应
+        :param counts: 方案数量矩阵，形状为(方案数, 成品数)
+        :param raw_width: 各方案的原料宽度
+        :param trim_width: 各方案的边丝宽度
+        :param cost: 各方案原料的单价
+        :param ids: 各方案的行号，取子集后保持不变，用于在不同子集之间对应同一个方案；None表示0..n-1
+        """
+        self.widths = np.asarray(widths, dtype=float)
+        counts = np.asarray(counts).reshape(-1, len(self.widths))
+        self.counts = counts.astype(small_uint_dtype(counts.max(initial=0)), copy=False)
+        self.scaled_widths = scale_widths(self.widths)
+        self.raw_width = np.asarray(raw_width)
+        self.trim_width = np.asarray(trim_width, dtype=float)
+        self.cost = np.asarray(cost)
+        if ids is None:
+            ids = np.arange(len(self.counts), dtype=small_uint_dtype(len(self.counts)))
+        self.ids = np.asarray(ids)
+
+    def __len__(self):
+        return len(self.counts)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.counts, self.raw_width, self.trim_width, self.cost, self.ids))
+
+    @classmethod
+    def empty(cls, widths, raw_dtype=np.int64, cost_dtype=np.int64):
+        return cls(widths, np.zeros((0, len(widths)), dtype=np.uint8), np.zeros(0, dtype=raw_dtype),
+                   np.zeros(0), np.zeros(0, dtype=cost_dtype))
+
+    @classmethod
+    def from_frame(cls, patterns, widths=None):
+        """
+        由CuttingPatterns.generate格式的DataFrame转换，行号取自DataFrame的索引
+        :param widths: 成品宽度，决定counts各列的顺序；None表示取除trim_width、raw_width、cost外的全部列
+        """
+        if widths is None:
+            widths = [column for column in patterns.columns if column not in ("trim_width", "raw_width", "cost")]
+        widths = list(widths)
+        return cls(widths, patterns[widths].to_numpy(), patterns["raw_width"].to_numpy(),
+                   patterns["trim_width"].to_numpy(), patterns["cost"].to_numpy(), patterns.index.to_numpy())
+
+    def to_frame(self):
+        """转换为DataFrame：各成品数量、trim_width、raw_width、cost，索引为行号"""
+        patterns = pd.DataFrame(self.counts, columns=list(self.widths), index=pd.Index(self.ids, dtype=np.int64))
+        patterns["trim_width"] = self.trim_width
+        patterns["raw_width"] = self.raw_width
+        patterns["cost"] = self.cost
+        return patterns
+
+    @classmethod
+    def concat(cls, stores):
+        """按顺序拼接成品宽度相同的多组方案，行号重新编为0..n-1"""
+        stores = list(stores)
+        for store in stores[1:]:
+            if not np.array_equal(store.widths, stores[0].widths):
+                raise ValueError("成品规格不一致，无法合并")
+        counts = np.concatenate([store.counts for store in stores])
+        return cls(stores[0].widths, counts, np.concatenate([store.raw_width for store in stores]),
+                   np.concatenate([store.trim_width for store in stores]),
+                   np.concatenate([store.cost for store in stores]))
+
+    def take(self, indices):
+        """按位置取出部分方案（或布尔掩码），保留原来的行号"""
+        return PatternStore(self.widths, self.counts[indices], self.raw_width[indices], self.trim_width[indices],
+                            self.cost[indices], self.ids[indices])
+
+    def select_widths(self, widths):
+        """按给定的成品宽度顺序重排counts的列"""
+        positions = pd.Index(self.widths).get_indexer(np.asarray(widths, dtype=float))
+        if (positions < 0).any():
+            raise ValueError("成品规格不一致")
+        return PatternStore(self.widths[positions], self.counts[:, positions], self.raw_width, self.trim_width,
+                            self.cost, self.ids)
+
+    def unit_costs(self):
+        """每个方案单位长度的原料价值"""
+        return self.cost.astype(float) * (self.raw_width.astype(float) - self.trim_width / 2)
+
+    def _group_rows(self, *vectors):
+        """
+        把成品数量相同、vectors中的值也相同的方案编为同一组。
+        逐列组合哈希后用pd.factorize分组，再与每组第一行逐列比较，哈希冲突的行单独成组。
+        :return: (每行的组号, 每行是否为所在组的第一行)
+        """
+        keys = [self.counts[:, j] for j in range(self.counts.shape[1])] + [np.asarray(v) for v in vectors]
+        hashes = np.zeros(len(self), dtype=np.uint64)
+        for key in keys:
+            hashes = hashes * np.uint64(1000003) ^ pd.util.hash_array(key)
+        codes, uniques = pd.factorize(hashes)
+
+        # factorize按出现顺序编号，组号首次超过之前最大值的行即该组的第一行
+        first = np.ones(len(codes), dtype=bool)
+        first[1:] = codes[1:] > np.maximum.accumulate(codes)[:-1]
+        first_rows = np.flatnonzero(first)
+        same = np.ones(len(codes), dtype=bool)
+        for key in keys:
+            same &= key[first_rows[codes]] == key
+        if not same.all():
+            codes[~same] = len(uniques) + np.arange((~same).sum())
+            first |= ~same
+        return codes, first
+
+    def deduplicate(self):
+        """去掉成品数量、原料宽度和价格都相同的重复方案，保留第一次出现的"""
+        _, first = self._group_rows(self.raw_width, self.cost)
+        return self if first.all() else self.take(first)
+
+    def merge(self, other):
+        """合并另一组方案并去重"""
+        return PatternStore.concat([self, other]).deduplicate()
+
+    def best_per_cost(self):
+        """成品数量相同的方案，对每种价格只取其中边丝最少的，保持原来的顺序"""
+        if len(self) == 0:
+            return self
+        codes, _ = self._group_rows(self.cost)
+        best = pd.Series(self.trim_width).groupby(codes, sort=False).idxmin().to_numpy()
+        return self.take(np.sort(best))
+
+    def filter_tolerance(self, tolerance):
+        """
+        只保留边丝小于tolerance的方案。每个组合在每个价格区间取的都是边丝最少的原料，与容忍度无关，
+        因此从较大容忍度生成的方案中取出的结果与直接用tolerance生成的相同。
+        """
+        return self.take(scale_widths(self.trim_width) < scale_widths(tolerance))
@@ -0,0 +1,244 @@
+import hashlib
+import io
+import threading
+from pathlib import Path
+
+import pandas as pd
+
+from pricing import PriceTable
+from result_cache import ResultCache
+from support import Brackets, SupportBracket, SpecificationError, display_in_Chinese
+from solution import Solution, solve_groups
+from solve_service import SolveClient
+
+# 界面默认的原料宽度范围和价格
+DEFAULT_RAW_RANGE = (1000, 1300)
+DEFAULT_PRICES = (3460, 3410)
+PRICE_SPLIT_WIDTH = 1250
+
+# 已读取的订单，按文件内容的哈希缓存；界面每次交互都会重新运行脚本，同一文件不必重新读取
+order_cache = ResultCache(max_memory_items=8)
+
+
+def get_density(material_type):
+    return SupportBracket.DENSITY[material_type]
+
+
+def load_order(file, cache=order_cache):
+    """
+    读取按输入模板填写的订单，解析规格并计算目标尺寸
+    :param file: xlsx文件路径或文件对象
+    :param cache: 按文件内容的哈希缓存读取结果，None表示不使用缓存
+    :return: DataFrame，每行一种成品，包含density
+    :raises SpecificationError: 有规格无法解析，errors中为每个出错的规格
+    """
+    if isinstance(file, (str, Path)):
+        content = Path(file).read_bytes()
+    elif hasattr(file, "getvalue"):
+        content = file.getvalue()
+    else:
+        content = file.read()
+    key = hashlib.sha1(content).hexdigest()
+    if cache is not None:
+        df = cache.get(key)
+        if df is not None:
+            return df
+
+    brackets = Brackets.from_excel(io.BytesIO(content), re_parse=True)
+    if not brackets.errors.empty:
+        raise SpecificationError(brackets.errors)
+    brackets.init_target_dimensions()
+    df = brackets.to_dataframe()
+    df["density"] = df["material_type"].apply(get_density)
+    if cache is not None:
+        cache.put(key, df)
+    return df
+
+
+def make_raw_materials(raw_range=DEFAULT_RAW_RANGE, discrete_widths=None):
+    """
+    :param raw_range: (最小宽度, 最大宽度)，其间每1mm一种原料
+    :param discrete_widths: 指定的原料宽度，给出时忽略raw_range
+    :return: DataFrame，包含width，已排序
+    """
+    if discrete_widths is not None:
+        widths = discrete_widths
+    else:
+        widths = range(raw_range[0], raw_range[1] + 1)
+    raw_materials = pd.DataFrame(data=widths, columns=["width"])
+    return raw_materials.sort_values(by="width", ignore_index=True)
+
+
+def make_cost_df(price_1000_1249=DEFAULT_PRICES[0], price_1250plus=DEFAULT_PRICES[1]):
+    """两档价格表：1250mm以下和1250mm及以上"""
+    return pd.DataFrame({"start_width": [1000, PRICE_SPLIT_WIDTH],
+                         "cost": [price_1000_1249, price_1250plus]})
+
+
+class OrderGroup:
+    """材质、厚度和材料类型都相同的一组成品，可以用同一种原料裁剪"""
+
+    def __init__(self, grade, thickness, material_type, items, products):
+        """
+        :param items: DataFrame，该组包含的成品（订单中的行）
+        :param products: DataFrame，包含width和total_length，每种展开宽度一行
+        """
+        self.grade = grade
+        self.thickness = thickness
+        self.material_type = material_type
+        self.items = items
+        self.products = products
+
+    def describe(self, index):
+        return f"第{index}组 ({self.material_type}, {self.grade}, {self.thickness}mm)"
+
+
+def group_order(order_df):
+    """按材质、目标厚度和材料类型分组，汇总每种展开宽度需要的总长度"""
+    groups = []
+    for (grade, thick, material), items in order_df.groupby(["grade", "thickness_t", "material_type"]):
+        items = items.copy()
+        items["total_length"] = items["count"] * items["length"]
+        products = items[["unfolded_width", "total_length"]].rename(columns={"unfolded_width": "width"})
+        products = products.groupby("width").sum().reset_index()
+        groups.append(OrderGroup(grade, thick, material, items, products))
+    return groups
+
+
+def _group_cost_dfs(groups, cost_df):
+    """PriceTable按各分组的材质和厚度取出价格，DataFrame原样返回"""
+    if isinstance(cost_df, PriceTable):
+        return [cost_df.cost_df(group.grade, group.thickness) for group in groups]
+    return cost_df
+
+
+def solve_order(groups, raw_materials, cost_df, max_patterns, service_url=None, **options):
+    """
+    求解订单的全部分组
+    :param cost_df: DataFrame，包含start_width和cost，所有分组使用同一价格；
+                    或PriceTable，按各分组的材质和厚度取价格
+    :param service_url: 求解服务的地址，给出时提交给求解服务，否则在本机用进程池求解
+    :param options: 传给solve_groups的其他参数，如workers、timeout、method、mode、backend、cache
+    :return: list，与groups顺序一致，每个元素为 (result, error)
+    """
+    products = [group.products for group in groups]
+    cost_df = _group_cost_dfs(groups, cost_df)
+    if service_url is not None:
+        # 求解服务自己管理求解进程、任务去重和录制，进程数、缓存等本地参数不适用
+        remote_options = {key: value for key, value in options.items()
+                          if key in ("timeout", "method", "mode", "rel_gap", "progress", "tolerance",
+                                     "backend", "threads", "cancel", "on_result")}
+        return SolveClient(service_url).solve_groups(products, raw_materials, cost_df, max_patterns,
+                                                     **remote_options)
+    return solve_groups(products,
+                        raw_materials=raw_materials,
+                        cost_df=cost_df,
+                        max_patterns=max_patterns,
+                        **options)
+
+
+class SolveJob:
+    """
+    在后台线程中求解订单的全部分组。界面每次重新运行脚本时读取进度和已完成分组的结果，
+    不必等待全部分组求解完成；cancel让正在运行的求解器提前停止并返回当前最好的方案。
+    使用求解服务时cancel只是不再等待未完成的分组，服务上的任务继续运行（见SolveClient.solve_groups）。
+    """
+
+    def __init__(self, groups, raw_materials, cost_df, max_patterns, executor, **options):
+        """
+        :param executor: 运行求解的线程池，如界面会话中保存的ThreadPoolExecutor
+        :param options: 传给solve_order的其他参数；progress、cancel和on_result由SolveJob提供
+        """
+        self.groups = groups
+        self.results = [None] * len(groups)  # 各分组的 (result, error)，未完成时为None
+        self.progress = [None] * len(groups)  # 各分组最近的进度 (用时, 当前最好成本, 成本下界)
+        self.error = None  # 整体求解失败时的异常，如求解服务出错、价格表中没有某个分组的价格
+        self._cancel = threading.Event()
+        self._future = executor.submit(self._run, raw_materials, cost_df, max_patterns, options)
+
+    def _run(self, raw_materials, cost_df, max_patterns, options):
+        try:
+            solutions = solve_order(self.groups, raw_materials, cost_df, max_patterns, progress=self._on_progress,
+                                    cancel=self._cancel, on_result=self._on_result, **options)
+        except Exception as e:
+            self.error = e
+            return
+        self.results = solutions
+
+    def _on_progress(self, group_index, elapsed, incumbent, bound):
+        self.progress[group_index] = (elapsed, incumbent, bound)
+
+    def _on_result(self, group_index, result, error):
+        self.results[group_index] = (result, error)
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    @property
+    def done(self):
+        return self._future.done()
+
+
+def sweep_order(groups, raw_materials, cost_df, max_patterns_values, tolerances, **options):
+    """
+    比较不同最大方案数和边丝容忍度下整个订单的成本，各分组依次用Solution.sweep求解
+    :param cost_df: DataFrame或PriceTable，见solve_order
+    :param options: 传给Solution.sweep的其他参数，如method、mode、time_limit、rel_gap、backend
+    :return: DataFrame，每组参数一行，列为tolerance、max_patterns、n_patterns（各分组使用的方案数之和）、
+             cost（元，有分组没有可行解时为NaN）、gap（各分组中最大的差距）
+    """
+    cost_dfs = _group_cost_dfs(groups, cost_df)
+    if not isinstance(cost_dfs, list):
+        cost_dfs = [cost_dfs] * len(groups)
+    frontiers = []
+    for group, group_cost_df in zip(groups, cost_dfs):
+        frontier = Solution(raw_materials=raw_materials, products=group.products,
+                            cost_df=group_cost_df.copy()).sweep(max_patterns_values, tolerances, **options)
+        # 目标函数为 单价 × 宽度(mm) × 长度(mm)，换算成元
+        frontier["cost"] = (pd.to_numeric(frontier["objective_value"]) * group.thickness
+                            * get_density(group.material_type) / 1e9)
+        frontier["gap"] = pd.to_numeric(frontier["gap"])
+        frontiers.append(frontier)
+    frontier = pd.concat(frontiers).groupby(["tolerance", "max_patterns"])
+    return pd.DataFrame({"n_patterns": frontier["n_patterns"].sum(),
+                         "cost": frontier["cost"].sum(min_count=len(groups)),
+                         "gap": frontier["gap"].max()}).reset_index()
+
+
+def format_result(result, group):
+    """
+    把一个分组的求解结果换算成展示用的中文表格：使用长度(m)、重量、利用率、单价和成本，
+    之后是各成品宽度的数量
+    """
+    table = display_in_Chinese(result)
+    table["使用长度(m)"] = table["使用长度(mm)"] / 1000
+    table["重量(吨)"] = (table["使用长度(m)"] * table["原料宽度(mm)"] * group.thickness
+                        / 1e6 * get_density(group.material_type))
+    table["原料利用率"] = 1 - table["边丝宽度(mm)"] / table["原料宽度(mm)"]
+    table["单价(元/吨)"] = table["cost"]
+    table["成本"] = table["重量(吨)"] * table["单价(元/吨)"]
+    col_in_order = (["原料宽度(mm)", "使用长度(m)", "重量(吨)", "原料利用率", "单价(元/吨)", "成本"] +
+                    [column for column in table.columns if isinstance(column, float)])
+    return table[col_in_order]
+
+
+def combine_results(groups, solutions):
+    """
+    把各分组的结果合并为一张表，按成功求解的分组依次编号
+    :return: (合并的DataFrame，没有成功的分组时为None, list of (分组, 错误信息))
+    """
+    tables, errors = [], []
+    for group, (result, error) in zip(groups, solutions):
+        if error is not None:
+            errors.append((group, error))
+        if result is not None:
+            table = format_result(result, group)
+            table.insert(0, "分组描述", group.describe(len(tables) + 1))
+            tables.append(table)
+    if not tables:
+        return None, errors
+    return pd.concat(tables, ignore_index=True), errors
@@ -0,0 +1,102 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+def price_widths(cost_df, raw_widths):
+    """
+    按宽度分档的价格表，用np.searchsorted整列查出每个原料宽度的单价
+    :param cost_df: DataFrame，包含start_width和cost，每档从start_width开始，直到下一档
+    :param raw_widths: 原料宽度的数组
+    :return: np.ndarray，与raw_widths对应的单价
+    """
+    cost_df = cost_df.sort_values(by="start_width")
+    tiers = np.searchsorted(cost_df.start_width.to_numpy(), np.asarray(raw_widths), side="right") - 1
+    if (tiers < 0).any():
+        raise ValueError("原料宽度超过价格范围。")
+    return cost_df.cost.to_numpy()[tiers]
+
+
+class PriceTable:
+    """
+    原料价格表：按宽度分任意多档，还可以按厚度分档、按材质区分。
+    求解时每个分组的材质和厚度是确定的，先用cost_df取出该分组按宽度分档的价格，
+    再用price_widths对整列方案定价。
+    """
+    # 价格表文件可以使用的中文表头
+    Chinese_English_mapping = {"起始宽度": "start_width",
+                               "单价": "cost",
+                               "起始厚度": "start_thickness",
+                               "材质": "grade"}
+
+    def __init__(self, table):
+        """
+        :param table: DataFrame，包含start_width和cost；
+                      可选start_thickness（该档适用于不小于它的厚度，空表示所有厚度）
+                      和grade（适用的材质，空表示没有单独定价的材质）
+        """
+        table = pd.DataFrame(table)
+        missing = {"start_width", "cost"} - set(table.columns)
+        if missing:
+            raise ValueError(f"价格表缺少列：{', '.join(sorted(missing))}")
+        table = table.copy()
+        if "start_thickness" not in table.columns:
+            table["start_thickness"] = 0.0
+        table["start_thickness"] = pd.to_numeric(table["start_thickness"], errors="coerce").fillna(0.0)
+        if "grade" not in table.columns:
+            table["grade"] = ""
+        table["grade"] = table["grade"].fillna("").astype(str).str.strip()
+        table["start_width"] = table["start_width"].astype(float)
+        table["cost"] = table["cost"].astype(float)
+        if table.duplicated(["grade", "start_thickness", "start_width"]).any():
+            raise ValueError("价格表中同一材质、厚度的起始宽度有重复。")
+        self.table = table.sort_values(["grade", "start_thickness", "start_width"], ignore_index=True)
+
+    @classmethod
+    def from_tiers(cls, start_widths, costs):
+        """只按宽度分档的价格表"""
+        return cls(pd.DataFrame({"start_width": start_widths, "cost": costs}))
+
+    @classmethod
+    def from_file(cls, file):
+        """
+        读取csv或xlsx格式的价格表，表头可以是中文（起始宽度、单价、起始厚度、材质）
+        :param file: 文件路径或带name属性的文件对象（如界面上传的文件）
+        """
+        name = str(getattr(file, "name", file))
+        if Path(name).suffix.lower() == ".csv":
+            table = pd.read_csv(file)
+        else:
+            table = pd.read_excel(file, engine="openpyxl")
+        return cls(table.rename(columns=cls.Chinese_English_mapping))
+
+    def cost_df(self, grade=None, thickness=None):
+        """
+        取出某种材质、厚度按宽度分档的价格。没有单独定价的材质，或该材质的厚度分档不包括该厚度时，
+        使用通用价格
+        :return: DataFrame，包含start_width和cost，按start_width排序
+        """
+        grade_rows = self.table.iloc[:0] if grade is None else self.table[self.table["grade"] == str(grade).strip()]
+        generic_rows = self.table[self.table["grade"] == ""]
+        if grade_rows.empty and generic_rows.empty:
+            raise ValueError(f"价格表中没有材质{grade}的价格。")
+        for rows in (grade_rows, generic_rows):
+            if rows.empty:
+                continue
+            levels = np.unique(rows["start_thickness"].to_numpy())
+            if thickness is None:
+                if len(levels) > 1:
+                    raise ValueError("价格表按厚度分档，需要给出厚度。")
+                level = 0
+            else:
+                level = np.searchsorted(levels, float(thickness), side="right") - 1
+                if level < 0:
+                    continue
+            rows = rows[rows["start_thickness"] == levels[level]]
+            return rows[["start_width", "cost"]].reset_index(drop=True)
+        raise ValueError(f"价格表中没有厚度{thickness}mm的价格。")
+
+    def lookup(self, raw_widths, grade=None, thickness=None):
+        """整列查出原料单价，见price_widths"""
+        return price_widths(self.cost_df(grade, thickness), raw_widths)
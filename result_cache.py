@@ -0,0 +1,129 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+
+def group_fingerprint(products, raw_materials, cost_df, max_patterns, **options):
+    """
+    计算一个分组全部求解输入的指纹，输入不变时指纹不变。
+    :param products: DataFrame，包含width和total_length，行的顺序不影响指纹
+    :param raw_materials: DataFrame，包含width
+    :param cost_df: DataFrame，包含start_width和cost
+    :param max_patterns: 最多使用的裁剪方案数
+    :param options: 其他影响结果的参数，如method、mode、time_limit、rel_gap、tolerance
+    """
+    digest = hashlib.sha1(ResultCache.VERSION.encode())
+    products = products.sort_values("width")
+    for array in (products["width"], products["total_length"], np.sort(raw_materials["width"]),
+                  cost_df.sort_values("start_width")["start_width"], cost_df.sort_values("start_width")["cost"]):
+        digest.update(np.asarray(array, dtype=np.float64).tobytes())
+        digest.update(b"|")
+    digest.update(repr((max_patterns, sorted(options.items()))).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """
+    分组求解结果缓存：进程内LRU + 磁盘上的pickle文件。
+    只修改了部分分组时，其余分组直接使用上次的结果，不再重新求解。
+    """
+    # 结果格式变化时修改版本号，使旧文件失效
+    VERSION = "2"
+
+    def __init__(self, cache_dir=None, max_memory_items=256, max_disk_bytes=256 * 2 ** 20):
+        """
+        :param cache_dir: 磁盘缓存目录，None表示只使用进程内缓存
+        :param max_memory_items: 进程内最多保存的结果数，超过后淘汰最久未使用的
+        :param max_disk_bytes: 磁盘缓存的最大字节数，超过后删除最久未使用的文件
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return self.cache_dir / f"{key}.pkl"
+
+    def get(self, key):
+        """命中时返回结果的副本，否则返回None"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key].copy()
+
+        if self.cache_dir is None:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                result = pickle.load(f)
+            os.utime(path)  # 更新访问时间，供淘汰时参考
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            return None
+        self._remember(key, result)
+        return result.copy()
+
+    def put(self, key, result):
+        result = result.copy()
+        self._remember(key, result)
+        if self.cache_dir is None:
+            return
+
+        # 先写临时文件再改名，多个进程同时写入也不会读到不完整的文件
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict_disk()
+
+    def _remember(self, key, result):
+        with self._lock:
+            self._memory.pop(key, None)
+            self._memory[key] = result
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        """按最近使用时间从旧到新删除，直到磁盘占用不超过上限"""
+        files = []
+        for path in self.cache_dir.glob("*.pkl"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.cache_dir is not None:
+            for path in self.cache_dir.glob("*.pkl"):
+                path.unlink(missing_ok=True)
+
+
+# 默认缓存，目录可用环境变量COILCUTTER_RESULT_CACHE_DIR指定
+default_result_cache = ResultCache(
+    cache_dir=os.environ.get("COILCUTTER_RESULT_CACHE_DIR",
+                             Path.home() / ".cache" / "coilcutter" / "results"))
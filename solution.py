@@ -1,15 +1,39 @@
 from ortools.linear_solver import pywraplp
-import itertools
 import pandas as pd
 import numpy as np
-import bisect
+import os
+import signal
+import time
+import multiprocessing
+from concurrent.futures import CancelledError, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pattern_cache import default_cache
+from pattern_model import PatternModel, ModelResult, get_backend
+from pattern_store import PatternStore, scale_widths
+from pricing import price_widths
+from result_cache import group_fingerprint
+from solve_stats import SolveStats
 
 
 class CuttingPatterns:
     def __init__(self,
                  products=pd.DataFrame(columns=["width"]),
-                 raw_materials=pd.DataFrame(columns=["width"])):
-        self.raw_matrices = {}  # Key: raw_width, Value: DataFrame of patterns
+                 raw_materials=pd.DataFrame(columns=["width"]),
+                 chunk_bytes=8 * 2 ** 20,
+                 memory_limit=None,
+                 cache=default_cache,
+                 stats=None):
+        """
+        :param chunk_bytes: 枚举时每块方案矩阵的最大字节数
+        :param memory_limit: 全部方案矩阵的最大字节数，None表示不限制
+        :param cache: PatternCache，缓存枚举结果；None表示不缓存
+        :param stats: SolveStats，记录各阶段用时和方案数；None表示新建一个
+        """
+        self.cache = cache
+        self.stats = stats if stats is not None else SolveStats()
+        self.chunk_bytes = chunk_bytes
+        self.memory_limit = memory_limit
+        self.raw_matrices = {}  # Key: raw_width, Value: PatternStore
         self.products = products.sort_values(by="width", ignore_index=True)
         self.raw_materials = raw_materials.sort_values(by="width", ignore_index=True)
 
@@ -24,23 +48,23 @@ class CuttingPatterns:
         for raw_width, df in self.raw_matrices.items():
             pattern_count += len(df)
             print(f"宽度为{raw_width}的原料裁剪方案为：共{len(df)}种。")
-            if detailed and not df.empty:
-                print(df)
-            if not df.empty:
+            if detailed and len(df) > 0:
+                print(df.to_frame())
+            if len(df) > 0:
                 width_count += 1
 
         print(f"总共为{width_count}种原料生成了{pattern_count}种方案。")
 
     def _add_patterns(self, raw_width, patterns):
         """
-        为当前实例添加方案。
+        为当前实例添加方案，与已有的方案合并去重。
         :param raw_width: 添加方案的原材料宽度。
-        :param patterns: DataFrame: 加入的方案
+        :param patterns: PatternStore或DataFrame: 加入的方案
         """
+        if isinstance(patterns, pd.DataFrame):
+            patterns = PatternStore.from_frame(patterns)
         if raw_width in self.raw_matrices:
-            self.raw_matrices[raw_width] = (pd.concat([
-                self.raw_matrices[raw_width], patterns]).
-                                            drop_duplicates(ignore_index=True))
+            self.raw_matrices[raw_width] = self.raw_matrices[raw_width].merge(patterns)
         else:
             self.raw_matrices[raw_width] = patterns
 
@@ -52,6 +76,97 @@ class CuttingPatterns:
             self._add_patterns(raw_width, df)
         return self
 
+    @staticmethod
+    def _reachable_widths(widths, capacity):
+        """
+        计算各成品后缀能恰好凑出的宽度。
+        :return: 累加表cum，成品k..n-1能凑出[a, b]内某个宽度当且仅当 cum[k, b+1] - cum[k, a] > 0
+        """
+        n = len(widths)
+        reachable = np.zeros((n + 1, capacity + 1), dtype=bool)
+        reachable[n, 0] = True
+        for k in range(n - 1, -1, -1):
+            reachable[k] = reachable[k + 1]
+            for shift in range(widths[k], capacity + 1, widths[k]):
+                reachable[k, shift:] |= reachable[k + 1, :capacity + 1 - shift]
+        reachable_cum = np.zeros((n + 1, capacity + 2), dtype=np.int32)
+        np.cumsum(reachable, axis=1, out=reachable_cum[:, 1:])
+        return reachable_cum
+
+    @staticmethod
+    def _enumerate_patterns(widths, raw_width, tolerance, chunk_rows=65536, reachable_cum=None):
+        """
+        有界背包深度优先枚举，只产生 raw_width - tolerance < 总宽度 <= raw_width 的方案。
+        已用宽度超过原料宽度，或剩余成品已无法凑到 raw_width - tolerance 以上时即剪枝，
+        因此耗时只与可行方案数成正比。
+        :param widths: 成品宽度，放大后的整数数组
+        :param raw_width: 原料宽度，放大后的整数
+        :param tolerance: 允许的边丝宽度，放大后的整数
+        :param chunk_rows: 每块最多的方案数
+        :param reachable_cum: _reachable_widths的结果，容量不小于raw_width时可在多种原料间复用
+        :return: 生成器，逐块产生方案的数量矩阵（uint8或uint16）
+        """
+        n = len(widths)
+        if n == 0 or raw_width <= 0:
+            return
+        low = max(raw_width - tolerance + 1, 0)  # 总宽度下限（含）
+        dtype = np.uint8 if raw_width // widths.min() <= np.iinfo(np.uint8).max else np.uint16
+        chunk_rows = max(chunk_rows, int(raw_width // widths.min()) + 1)
+        if reachable_cum is None:
+            reachable_cum = CuttingPatterns._reachable_widths(widths, raw_width)
+
+        def completable(k, used):
+            """成品k..n-1能否把已用宽度used补到[low, raw_width]之间"""
+            start, stop = max(low - used, 0), raw_width - used
+            return reachable_cum[k, stop + 1] - reachable_cum[k, start] > 0
+
+        buffer = np.empty((chunk_rows, n), dtype=dtype)
+        filled = 0
+        counts = [-1] * n
+        used = [0] * n
+        level = 0
+        while level >= 0:
+            if level == n - 1:
+                # 最后一种成品：可行数量是一段连续区间，整段写入
+                w = widths[level]
+                c_low = -(-max(low - used[level], 0) // w)
+                c_high = (raw_width - used[level]) // w
+                rows = c_high - c_low + 1
+                if rows > 0:
+                    if filled + rows > chunk_rows:
+                        yield buffer[:filled]
+                        buffer = np.empty((chunk_rows, n), dtype=dtype)
+                        filled = 0
+                    buffer[filled:filled + rows, :level] = counts[:level]
+                    buffer[filled:filled + rows, level] = np.arange(c_low, c_high + 1)
+                    filled += rows
+                level -= 1
+                continue
+
+            counts[level] += 1
+            next_used = used[level] + counts[level] * widths[level]
+            if next_used > raw_width:
+                counts[level] = -1
+                level -= 1
+            elif completable(level + 1, next_used):
+                used[level + 1] = next_used
+                level += 1
+        if filled > 0:
+            yield buffer[:filled]
+
+    def _collect_patterns(self, widths, raw_width, tolerance, reachable_cum=None):
+        """逐块枚举方案并拼接，累计占用超过memory_limit时报错"""
+        chunk_rows = max(self.chunk_bytes // max(len(widths), 1), 1)
+        chunks = []
+        for chunk in self._enumerate_patterns(widths, raw_width, tolerance, chunk_rows, reachable_cum):
+            self._pattern_bytes += chunk.nbytes
+            if self.memory_limit is not None and self._pattern_bytes > self.memory_limit:
+                raise MemoryError(f"裁剪方案超过内存上限{self.memory_limit}字节，请减少成品种类或改用列生成。")
+            chunks.append(chunk)
+        if not chunks:
+            return np.zeros((0, len(widths)), dtype=np.uint8)
+        return np.concatenate(chunks)
+
     def _generate_patterns(self, tolerance: int, raw_materials=None, products=None):
         """
 
@@ -64,139 +179,1162 @@ class CuttingPatterns:
             raw_materials = self.raw_materials
         if products is None:
             products = self.products
+        columns = list(products.width.values) + ["trim_width", "raw_width"]
         if not len(raw_materials.width) > 0:
-            return pd.DataFrame(columns=products.width)
+            return pd.DataFrame(columns=columns)
 
-        max_counts = (raw_materials.width.values.reshape(-1, 1) //
-                      products.width.values.reshape(1, -1))
+        widths = scale_widths(products.width.values)
+        reachable_cum = self._reachable_widths(widths, int(scale_widths(raw_materials.width.max())))
+        self._pattern_bytes = 0
         patterns = []
-        for r in range(len(raw_materials.width)):
-            # 生成所有组合
-            temp = itertools.product(*[range(int(count) + 1) for count in max_counts[r]])
-            temp_df = pd.DataFrame(temp, columns=products.width.values)
-
-            # 计算每种组合的总宽度
-            whole_width = temp_df.values.dot(products.width.values.reshape(-1, 1))
-            temp_df["trim_width"] = raw_materials.loc[r, "width"] - whole_width
-            temp_df["raw_width"] = raw_materials.loc[r, "width"]
-
-            # 筛选边丝宽度不超过最小成品宽度的
-            filtered_df = temp_df[(whole_width.flatten() <= raw_materials.loc[r, "width"]) &
-                                  (whole_width.flatten() > (
-                                          raw_materials.loc[r, "width"] - tolerance))]
-
-            if len(filtered_df) > 0:
-                patterns.append(filtered_df)
+        for raw_width in raw_materials.width.values:
+            # 逐块枚举可行方案
+            counts = self._collect_patterns(widths, int(scale_widths(raw_width)),
+                                            int(scale_widths(tolerance)), reachable_cum)
+            if len(counts) == 0:
+                continue
+
+            temp_df = pd.DataFrame(counts, columns=products.width.values)
+            temp_df["trim_width"] = raw_width - counts.dot(products.width.values.astype(float))
+            temp_df["raw_width"] = raw_width
+            patterns.append(temp_df)
+        if not patterns:
+            return pd.DataFrame(columns=columns)
         return pd.concat(patterns, ignore_index=True)
 
     @staticmethod
     def _price_patterns(patterns, cost_df):
-        if patterns.raw_width.min() < cost_df.start_width.min():
-            raise ValueError("原料宽度超过价格范围。")
-        cost_df = cost_df.sort_values(by="start_width", ignore_index=True)
-        cost_list = list(cost_df.start_width)
-
-        def _price_raw(raw_width):
-            idx = bisect.bisect_right(cost_list, raw_width) - 1
-            return cost_df.loc[idx, "cost"]
-
-        patterns["cost"] = patterns["raw_width"].map(_price_raw)
+        patterns["cost"] = price_widths(cost_df, patterns["raw_width"])
         return patterns
 
     @staticmethod
     def _filter_patterns(patterns):
         """对于生成完全相同成品的pattern，对每种价格只取其中边丝最少的"""
-        by = list(patterns.columns[:-3]) + ["cost"]
-        indices = patterns.groupby(by)["trim_width"].idxmin()
-        return patterns.loc[indices].reset_index(drop=True)
+        store = PatternStore.from_frame(patterns.reset_index(drop=True), patterns.columns[:-3])
+        return store.best_per_cost().to_frame().reset_index(drop=True)
+
+    def _generate_priced_patterns(self, tolerance, cost_df):
+        """
+        成品组合只枚举一次（直到最大原料宽度），再用np.searchsorted映射到可用的原料宽度。
+        总宽度为w的组合只适用于 w <= 原料宽度 < w + tolerance 的原料，每个价格区间直接取其中
+        边丝最少的原料，结果与依次调用_generate_patterns、_price_patterns、_filter_patterns相同。
+        :param tolerance: 允许的边丝宽度
+        :param cost_df: DataFrame，包含start_width和cost，已按start_width排序
+        :return: PatternStore
+        """
+        products, raw_materials = self.products, self.raw_materials
+        if not len(raw_materials.width) > 0 or not len(products.width) > 0:
+            return PatternStore.empty(products.width.values, raw_materials.width.dtype, cost_df.cost.dtype)
+        if raw_materials.width.min() < cost_df.start_width.min():
+            raise ValueError("原料宽度超过价格范围。")
+
+        # 一次枚举总宽度落在 (最小原料宽度 - tolerance, 最大原料宽度] 的全部组合
+        widths = scale_widths(products.width.values)
+        raw_widths = raw_materials.width.values
+        scaled_raw = scale_widths(raw_widths)
+        scaled_tolerance = int(scale_widths(tolerance))
+        with self.stats.stage("enumerate"):
+            key = self.cache.make_key(widths, scaled_raw, scaled_tolerance) if self.cache is not None else None
+            counts = self.cache.get(key) if self.cache is not None else None
+            self.stats.cache_hit = counts is not None
+            if counts is None:
+                self._pattern_bytes = 0
+                counts = self._collect_patterns(widths, int(scaled_raw[-1]),
+                                                int(scaled_raw[-1] - scaled_raw[0]) + scaled_tolerance)
+                if self.cache is not None:
+                    self.cache.put(key, counts)
+        self.stats.pattern_counts["enumerated"] = len(counts)
+
+        with self.stats.stage("price"):
+            patterns = self._price_combinations(counts, tolerance, cost_df)
+        self.stats.pattern_counts["priced"] = len(patterns)
+        return patterns
+
+    def _price_combinations(self, counts, tolerance, cost_df):
+        """把成品组合映射到原料宽度和价格区间，每个区间只保留边丝最少的原料，即标价和过滤"""
+        products, raw_materials = self.products, self.raw_materials
+        widths = scale_widths(products.width.values)
+        raw_widths = raw_materials.width.values
+        scaled_raw = scale_widths(raw_widths)
+        scaled_tolerance = int(scale_widths(tolerance))
+        used = counts.dot(widths)
+
+        # 每个价格区间内，取不小于组合总宽度的最窄原料
+        bounds = np.append(np.searchsorted(scaled_raw, scale_widths(cost_df.start_width.values)),
+                           len(scaled_raw))
+        combo_ids, raw_ids, tier_ids = [], [], []
+        for tier in range(len(cost_df)):
+            start, stop = bounds[tier], max(bounds[tier], bounds[tier + 1])
+            idx = np.searchsorted(scaled_raw[start:stop], used) + start
+            valid = idx < stop
+            valid[valid] = scaled_raw[idx[valid]] < used[valid] + scaled_tolerance
+            valid_ids = np.nonzero(valid)[0]
+            combo_ids.append(valid_ids)
+            raw_ids.append(idx[valid_ids])
+            tier_ids.append(np.full(len(valid_ids), tier))
+        combo_ids, raw_ids, tier_ids = (np.concatenate(combo_ids), np.concatenate(raw_ids),
+                                        np.concatenate(tier_ids))
 
-    def generate(self, cost_df):
+        # 不同区间价格相同时，同一组合只保留边丝最少的；结果按组合、价格排序
+        costs = cost_df.cost.values[tier_ids]
+        trims = raw_widths[raw_ids] - counts[combo_ids].dot(products.width.values.astype(float))
+        order = np.lexsort((trims, costs, combo_ids))
+        combo_ids, raw_ids, costs, trims = combo_ids[order], raw_ids[order], costs[order], trims[order]
+        keep = np.ones(len(order), dtype=bool)
+        keep[1:] = (combo_ids[1:] != combo_ids[:-1]) | (costs[1:] != costs[:-1])
+
+        return PatternStore(products.width.values, counts[combo_ids[keep]], raw_widths[raw_ids[keep]], trims[keep],
+                            costs[keep])
+
+    def generate_store(self, cost_df, tolerance=None):
+        """
+        :param tolerance: 允许的边丝宽度（mm），None表示取最窄成品宽度
+        :return: PatternStore，列按成品宽度从小到大排列
+        """
         # 排序数据
         cost_df.sort_values(by="start_width", axis=0, inplace=True, ignore_index=True)
         self.products.sort_values(by="width", axis=0, inplace=True, ignore_index=True)
+        if tolerance is None:
+            tolerance = self.products.width.min()
 
-        # 生成全部pattern
-        self.raw_matrix = self._generate_patterns(tolerance=self.products.width.min(),
-                                                  raw_materials=self.raw_materials,
-                                                  products=self.products)
-
-        # 给每个pattern标价格
-        self.raw_matrix = self._price_patterns(self.raw_matrix, cost_df)
+        # 一次枚举全部pattern，同时标价格并过滤低效pattern
+        return self._generate_priced_patterns(tolerance=tolerance, cost_df=cost_df)
 
-        # 过滤低效pattern
-        self.raw_matrix = self._filter_patterns(self.raw_matrix)
+    def generate(self, cost_df, tolerance=None):
+        """与generate_store相同，返回DataFrame，包含各成品数量、trim_width、raw_width和cost"""
+        self.raw_matrix = self.generate_store(cost_df, tolerance).to_frame()
         return self.raw_matrix
 
 
+class ColumnGeneration:
+    """
+    Gilmore-Gomory列生成：在少量方案上求解LP主问题，用对偶价格求解有界背包定价子问题，
+    把检验数为负的方案加入方案池，直到没有可改进的方案为止。
+    生成的方案与CuttingPatterns.generate的结果格式相同。
+    """
+    def __init__(self,
+                 products=pd.DataFrame(columns=["width", "total_length"]),
+                 raw_materials=pd.DataFrame(columns=["width"]),
+                 max_iterations=200,
+                 columns_per_iteration=10,
+                 stats=None):
+        """
+        :param products: DataFrame，包含width和total_length两列
+        :param raw_materials: DataFrame，包含width
+        :param max_iterations: 最多迭代次数
+        :param columns_per_iteration: 每次迭代最多加入的方案数
+        :param stats: SolveStats，记录各阶段用时和方案数；None表示新建一个
+        """
+        self.products = products.sort_values(by="width", ignore_index=True)
+        self.raw_materials = raw_materials.sort_values(by="width", ignore_index=True)
+        self.max_iterations = max_iterations
+        self.columns_per_iteration = columns_per_iteration
+        self.lp_bound = None  # 收敛时主问题的LP最优值；达到最多迭代次数仍未收敛时为None
+        self.stats = stats if stats is not None else SolveStats()
+
+    def _price_raw_widths(self, cost_df):
+        """按价格区间给每种原料宽度标价"""
+        raw_widths = self.raw_materials.width.values.astype(float)
+        if raw_widths.min() < cost_df.start_width.min():
+            raise ValueError("原料宽度超过价格范围。")
+        tiers = np.searchsorted(cost_df.start_width.values, raw_widths, side="right") - 1
+        return raw_widths, tiers, cost_df.cost.values[tiers].astype(float)
+
+    @staticmethod
+    def _knapsack(scaled_widths, values, capacity):
+        """
+        有界背包：二进制拆分后按0-1背包做动态规划
+        :return: (best, take, chunks)，best[u]为恰好使用宽度u时的最大价值（不可达时为-inf），
+                 take和chunks用于_backtrack回溯方案
+        """
+        chunks = []
+        for i, w in enumerate(scaled_widths):
+            bound, k = capacity // w, 1
+            while bound > 0:
+                k = min(k, bound)
+                chunks.append((i, k))
+                bound -= k
+                k *= 2
+
+        best = np.full(capacity + 1, -np.inf)
+        best[0] = 0
+        take = np.zeros((len(chunks), capacity + 1), dtype=bool)
+        for j, (i, k) in enumerate(chunks):
+            w = k * scaled_widths[i]
+            candidate = np.full(capacity + 1, -np.inf)
+            candidate[w:] = best[:capacity + 1 - w] + k * values[i]
+            take[j] = candidate > best
+            best = np.where(take[j], candidate, best)
+        return best, take, chunks
+
+    @staticmethod
+    def _backtrack(scaled_widths, take, chunks, used):
+        """回溯恰好使用宽度used时的各成品数量"""
+        counts = np.zeros(len(scaled_widths), dtype=int)
+        for j in range(len(chunks) - 1, -1, -1):
+            if take[j, used]:
+                i, k = chunks[j]
+                counts[i] += k
+                used -= k * scaled_widths[i]
+        return counts
+
+    def _pricing(self, duals, raw_widths, tiers, costs, tolerance):
+        """
+        有界背包定价子问题：对每种原料宽度W，找出使检验数
+        cost * (W + used) / 2 - Σ a_i * π_i 最小的方案，其中 W - tolerance < used <= W。
+        同一价格区间的原料共用一次动态规划。
+        :return: list of (检验数, 原料宽度, 价格, 各成品数量)
+        """
+        widths = self.products.width.values.astype(float)
+        scaled_widths = scale_widths(widths)
+        scaled_raw = scale_widths(raw_widths)
+        scaled_tolerance = int(scale_widths(tolerance))
+
+        candidates = []
+        for tier in np.unique(tiers):
+            in_tier = tiers == tier
+            cost = costs[in_tier][0]
+            best, take, chunks = self._knapsack(scaled_widths, duals - cost * widths / 2, scaled_raw[in_tier].max())
+            for raw_width, scaled in zip(raw_widths[in_tier], scaled_raw[in_tier]):
+                low = max(scaled - scaled_tolerance + 1, 1)
+                if low > scaled:
+                    continue
+                used = low + int(np.argmax(best[low:scaled + 1]))
+                reduced_cost = cost * raw_width / 2 - best[used]
+                if not np.isfinite(reduced_cost) or reduced_cost > -1e-6 * cost * raw_width:
+                    continue
+                candidates.append((reduced_cost, raw_width, cost,
+                                   self._backtrack(scaled_widths, take, chunks, used)))
+        return candidates
+
+    def _covering_pattern(self, raw_widths, tiers, costs, tolerance):
+        """
+        包含每种成品至少一件的方案中，单独满足全部需求时成本最低的一个：先各放一件，剩余宽度用背包
+        尽量填满。加入初始方案池后，只要存在这样的方案，任何方案数上限下都有可行解（即只用一个方案的贪心解）。
+        :return: (原料宽度, 价格, 各成品数量)，没有这样的方案时返回None
+        """
+        widths = self.products.width.values.astype(float)
+        demands = self.products.total_length.values.astype(float)
+        scaled_widths = scale_widths(widths)
+        scaled_raw = scale_widths(raw_widths)
+        scaled_tolerance = int(scale_widths(tolerance))
+        reserved = int(scaled_widths.sum())
+        if reserved > scaled_raw.max():
+            return None
+
+        best_pattern, best_cost = None, np.inf
+        reachable, take, chunks = self._knapsack(scaled_widths, np.zeros(len(widths)), scaled_raw.max() - reserved)
+        for raw_width, scaled, cost in zip(raw_widths, scaled_raw, costs):
+            # 剩余宽度中能恰好填满的最大宽度，边丝最少
+            low = max(scaled - scaled_tolerance + 1 - reserved, 0)
+            if low > scaled - reserved:
+                continue
+            filled = np.flatnonzero(np.isfinite(reachable[low:scaled - reserved + 1]))
+            if len(filled) == 0:
+                continue
+            extra = low + int(filled[-1])
+            counts = 1 + self._backtrack(scaled_widths, take, chunks, extra)
+            trim_width = raw_width - float(counts.dot(widths))
+            total_cost = cost * (raw_width - trim_width / 2) * (demands / counts).max()
+            if total_cost < best_cost:
+                best_pattern, best_cost = (raw_width, cost, counts), total_cost
+        return best_pattern
+
+    def generate(self, cost_df, tolerance=None):
+        """
+        :param tolerance: 允许的边丝宽度（mm），None表示取最窄成品宽度
+        """
+        cost_df = cost_df.sort_values(by="start_width", ignore_index=True)
+        if tolerance is None:
+            tolerance = self.products.width.min()
+        raw_widths, tiers, costs = self._price_raw_widths(cost_df)
+        demands = self.products.total_length.values.astype(float)
+
+        # LP主问题，用人工变量保证初始可行
+        solver = pywraplp.Solver.CreateSolver("GLOP")
+        constraints = [solver.Constraint(float(d), solver.infinity()) for d in demands]
+        objective = solver.Objective()
+        objective.SetMinimization()
+        penalty = 1e3 * costs.max() * raw_widths.max()
+        for i, constraint in enumerate(constraints):
+            artificial = solver.NumVar(0, solver.infinity(), f"s_{i}")
+            constraint.SetCoefficient(artificial, 1)
+            objective.SetCoefficient(artificial, penalty)
+
+        pool = []
+        seen = set()
+
+        def add_column(raw_width, cost, counts):
+            key = (raw_width, tuple(counts))
+            if key in seen:
+                return False
+            seen.add(key)
+            trim_width = raw_width - float(counts.dot(self.products.width.values))
+            l = solver.NumVar(0, solver.infinity(), f"l_{len(pool)}")
+            objective.SetCoefficient(l, float(cost * (raw_width - trim_width / 2)))
+            for i, count in enumerate(counts):
+                if count:
+                    constraints[i].SetCoefficient(l, float(count))
+            pool.append(list(counts) + [trim_width, raw_width, cost])
+            return True
+
+        # 定价只追求LP最优，生成的方案不一定能组成方案数少的可行解，先放入一个覆盖全部成品的方案
+        covering = self._covering_pattern(raw_widths, tiers, costs, tolerance)
+        if covering is not None:
+            add_column(*covering)
+
+        converged = False
+        for iteration in range(1, self.max_iterations + 1):
+            self.stats.iterations = iteration
+            with self.stats.stage("master"):
+                status = solver.Solve()
+            if status != pywraplp.Solver.OPTIMAL:
+                raise ValueError("列生成主问题求解失败。")
+            duals = np.array([constraint.dual_value() for constraint in constraints])
+
+            # 取检验数最小的若干个新方案加入主问题
+            with self.stats.stage("pricing"):
+                candidates = sorted(self._pricing(duals, raw_widths, tiers, costs, tolerance),
+                                    key=lambda c: c[0])
+            added = 0
+            for _, raw_width, cost, counts in candidates:
+                added += add_column(raw_width, cost, counts)
+                if added >= self.columns_per_iteration:
+                    break
+            if added == 0:
+                converged = True
+                break
+        # 没有检验数为负的方案时，主问题的LP最优值是全部方案上（不限方案数）的成本下界
+        self.lp_bound = objective.Value() if converged else None
+        self.stats.pattern_counts["columns"] = len(pool)
+
+        patterns = pd.DataFrame(pool, columns=list(self.products.width.values) +
+                                              ["trim_width", "raw_width", "cost"])
+        return patterns.astype({**{w: int for w in self.products.width.values},
+                                "raw_width": self.raw_materials.width.dtype,
+                                "cost": cost_df.cost.dtype})
+
+
 class Solution:
-    def __init__(self, raw_materials=None, products=None, cost_df=None):
+    RELATIVE_MIP_GAP = 1e-4
+    # 先定价后分支时保留的方案：LP解中使用的，以及检验数不超过单位长度成本的这一比例的
+    REDUCED_COST_TOLERANCE = 0.01
+
+    def __init__(self, raw_materials=None, products=None, cost_df=None, cache=default_cache):
         """
         :param raw_materials: DataFrame,包含width
         :param products: DataFrame,包含width和total_length两列
+        :param cache: PatternCache，枚举方案时使用的缓存；None表示不缓存
         """
         self.result = None
+        self.stats = SolveStats()  # 各阶段用时、方案数、模型规模等统计信息
+        self.timings = self.stats.timings  # 各阶段用时（秒）：generate、presolve、heuristic、build、solve
+        self.status = None  # 求解状态：OPTIMAL、FEASIBLE、NO_SOLUTION_FOUND等
+        self.objective_value = None  # 结果的成本
+        self.best_bound = None  # 成本下界，快速求解时为LP松弛下界
+        self.gap = None  # 结果成本与下界的相对差距
+        # 列生成只生成一部分方案，在这些方案上得到的下界不是原问题的下界
+        self.complete_patterns = True  # 生成的是否为全部可用的方案
+        self.pattern_bound = None  # 方案不完整时全部方案上的成本下界（列生成收敛时的LP下界），未知时为None
+        # 保留最近一次求解的方案和模型，修改需求、成品或价格后用resolve重新求解
+        self.solve_options = None  # 最近一次solve的参数
+        self.live_patterns = None  # 预处理后的方案
+        self.live_model = None  # 在live_patterns上建立的整数规划模型，快速求解时为None
+        self.solved_model = None  # 最近一次实际求解的模型，先定价后分支时为限制后的模型，快速求解时为None
+        self.patterns_outdated = False  # 成品或价格已修改，方案需要重新生成
         self.products = products
         self.raw_materials = raw_materials
         self.cost_df = cost_df
+        self.cache = cache
+
+    def solve(self, max_patterns, method="exhaustive", time_limit=None, mode="mip",
+              rel_gap=None, progress=None, tolerance=None, backend="scip", threads=None, cancel=None):
+        """
+        求解并返回成本最低的方案。到达时限或相对差距时返回当前最好的可行解，
+        状态、成本、下界和差距记录在status、objective_value、best_bound、gap以及result.attrs中。
+        :param max_patterns: 最多使用的裁剪方案数
+        :param method: "exhaustive"：枚举全部裁剪方案后求解；
+                       "column_generation"：列生成，只在定价生成的方案上求解，下界为列生成的LP下界
+        :param time_limit: 最长求解时间（秒），None表示不限制。生成方案的用时从中扣除，剩余的时间交给求解器；
+                           方案生成本身不会中途停止，生成很慢时总用时可能超过时限
+        :param mode: "mip"：整数规划求最优解，以贪心解作为初始解；
+                     "heuristic"：只用贪心算法快速求解，用于报价，与LP下界的差距记录在gap中；
+                     "price_and_branch"：先用GLOP求解LP松弛，只在LP解中使用的和检验数较小的方案上
+                     求解整数规划，方案很多时远快于"mip"，下界为LP下界
+        :param rel_gap: 与下界的相对差距不超过该值即停止，None表示RELATIVE_MIP_GAP
+        :param progress: 回调函数 progress(用时, 当前最好成本, 成本下界)，返回True时提前停止
+        :param tolerance: 允许的边丝宽度（mm），None表示取最窄成品宽度
+        :param backend: 整数规划求解器，"scip"或"cp_sat"（使用长度取整数mm，可多线程并行搜索），
+                        见pattern_model.BACKENDS
+        :param threads: 求解器使用的线程数，None表示使用求解器的默认值
+        :param cancel: threading.Event或Manager().Event()，设置后中断求解器并返回当前最好的可行解；
+                       在生成方案、预处理、贪心求解等阶段之间也会检查，此时有贪心解就返回贪心解
+        """
+        start = time.perf_counter()
+        get_backend(backend)
+        self.stats = SolveStats(method, mode, backend, threads)
+        self.timings = self.stats.timings
+        self.solve_options = {"max_patterns": max_patterns, "method": method, "mode": mode,
+                              "tolerance": tolerance, "backend": backend, "threads": threads}
+        self.patterns_outdated = False
+        patterns = self._generate(method, tolerance)
+        if self._cancelled(cancel):
+            return self._stop_cancelled(patterns, None)
+
+        if time_limit is not None:
+            time_limit = max(time_limit - (time.perf_counter() - start), 0)
+        return self._solve_patterns(patterns, max_patterns, time_limit, mode, rel_gap, progress, backend, threads,
+                                    cancel)
+
+    def update_demands(self, total_lengths):
+        """
+        修改成品的需求长度。方案不变，resolve时原地修改已建立的模型
+        :param total_lengths: dict或Series，成品宽度 -> 新的总长度
+        """
+        total_lengths = pd.Series(total_lengths, dtype=float)
+        total_lengths.index = total_lengths.index.astype(float)
+        unknown = total_lengths.index[~total_lengths.index.isin(self.products.width.astype(float))]
+        if len(unknown):
+            raise ValueError(f"没有宽度为{', '.join(f'{width:g}' for width in unknown)}的成品，请用add_product添加")
+        products = self.products.copy()
+        updated = products.width.astype(float).map(total_lengths)
+        products["total_length"] = updated.fillna(products.total_length.astype(float))
+        self.products = products
+        self.pattern_bound = None  # 列生成的下界对应原来的需求
+
+    def add_product(self, width, total_length):
+        """增加一种成品，resolve时重新生成方案"""
+        if (self.products.width == width).any():
+            raise ValueError(f"已有宽度为{width:g}的成品，请用update_demands修改需求")
+        self.products = pd.concat([self.products, pd.DataFrame({"width": [float(width)],
+                                                                "total_length": [float(total_length)]})],
+                                  ignore_index=True)
+        self.patterns_outdated = True
+
+    def remove_product(self, width):
+        """去掉一种成品，resolve时重新生成方案"""
+        keep = self.products.width != width
+        if keep.all():
+            raise ValueError(f"没有宽度为{width:g}的成品")
+        if not keep.any():
+            raise ValueError("至少需要保留一种成品")
+        self.products = self.products[keep].reset_index(drop=True)
+        self.patterns_outdated = True
+
+    def update_prices(self, cost_df):
+        """
+        修改原料价格。resolve时重新标价生成方案，方案与之前相同时只原地修改模型的目标函数
+        :param cost_df: DataFrame，包含start_width和cost
+        """
+        self.cost_df = cost_df
+        self.patterns_outdated = True
+
+    def resolve(self, time_limit=None, rel_gap=None, progress=None, cancel=None):
+        """
+        用update_demands、add_product、remove_product、update_prices修改后，沿用上一次solve的参数重新求解。
+        只修改了需求时不重新生成方案；方案不变时原地修改已建立的模型，不重新建模；
+        上一次的解中仍然可用的方案在新的需求下用LP重新分配长度，作为初始解。
+        :param time_limit: 最长求解时间（秒），见solve
+        :param rel_gap: 见solve
+        :param progress: 见solve
+        :param cancel: 见solve
+        :return: 同solve
+        """
+        if self.solve_options is None:
+            raise ValueError("请先调用solve求解")
+        options = self.solve_options
+        start = time.perf_counter()
+        self.stats = SolveStats(options["method"], options["mode"], options["backend"], options["threads"])
+        self.timings = self.stats.timings
+
+        patterns, model = self.live_patterns, self.live_model
+        if self.patterns_outdated or patterns is None:
+            outdated = patterns
+            patterns = self._generate(options["method"], options["tolerance"])
+            with self.stats.stage("presolve"):
+                patterns = self._presolve_patterns(patterns)
+            if model is not None and not self._same_patterns(patterns, outdated):
+                model = None
+            self.patterns_outdated = False
+            if self._cancelled(cancel):
+                return self._stop_cancelled(patterns, None)
+        if model is not None:
+            with self.stats.stage("update"):
+                model.set_demands(self.products.total_length.to_numpy(dtype=float), self._big_m(patterns))
+                model.set_costs(self._pattern_costs(patterns))
+        with self.stats.stage("warm_start"):
+            warm_start = self._previous_plan(patterns)
+
+        if time_limit is not None:
+            time_limit = max(time_limit - (time.perf_counter() - start), 0)
+        return self._solve_presolved(patterns, options["max_patterns"], time_limit, options["mode"], rel_gap,
+                                     progress, options["backend"], options["threads"], model=model,
+                                     warm_starts=[warm_start], cancel=cancel)
+
+    @staticmethod
+    def _same_patterns(patterns, other):
+        """两组方案的成品宽度、各成品数量和原料宽度是否逐行相同，相同时可以沿用同一个模型"""
+        return (other is not None and np.array_equal(patterns.widths, other.widths)
+                and np.array_equal(patterns.counts, other.counts)
+                and np.array_equal(patterns.raw_width, other.raw_width))
+
+    def _previous_plan(self, patterns):
+        """
+        上一次的解中仍然可用的方案（按各成品数量和原料宽度对应），在当前需求下用LP重新分配使用长度
+        :return: 每个方案的使用长度（np.ndarray），没有上一次的解或这些方案不能满足当前需求时返回None
+        """
+        if self.result is None or self.result.empty:
+            return None
+        widths = list(patterns.widths)
+        previous = self.result
+        # 包含已去掉的成品的方案不再可用，新增的成品数量为0
+        removed = [column for column in previous.columns if isinstance(column, float) and column not in widths]
+        previous = previous[(previous[removed] == 0).all(axis=1)].reindex(columns=widths + ["raw_width"],
+                                                                         fill_value=0)
+        current = pd.DataFrame(patterns.counts, columns=widths)
+        current["raw_width"] = patterns.raw_width
+        current["position"] = np.arange(len(patterns))
+        chosen = current.merge(previous, on=widths + ["raw_width"])["position"].unique()
+        if len(chosen) == 0:
+            return None
+        return self._polish(patterns.counts, self._pattern_costs(patterns), chosen)
+
+    def _generate(self, method, tolerance):
+        """
+        按method生成裁剪方案，统计记录在self.stats中
+        :return: PatternStore，counts各列与self.products的行顺序一致
+        """
+        with self.stats.stage("generate"):
+            if method == "exhaustive":
+                patterns = CuttingPatterns(raw_materials=self.raw_materials, products=self.products,
+                                           cache=self.cache, stats=self.stats).generate_store(self.cost_df, tolerance)
+            elif method == "column_generation":
+                generator = ColumnGeneration(raw_materials=self.raw_materials, products=self.products,
+                                             stats=self.stats)
+                patterns = PatternStore.from_frame(generator.generate(self.cost_df, tolerance))
+            else:
+                raise ValueError(f"不支持的求解方式：{method}")
+        self.complete_patterns = method == "exhaustive"
+        self.pattern_bound = None if self.complete_patterns else generator.lp_bound
+        return patterns.select_widths(self.products.width.values)
+
+    @staticmethod
+    def _pattern_costs(patterns):
+        """每个方案单位长度的原料价值"""
+        return patterns.unit_costs()
+
+    def _presolve_patterns(self, patterns):
+        """
+        去掉被占优的方案：若另一方案的各成品数量都不少于它，单位长度成本又不更高，
+        则它在任何解中都可以被替换掉。这里检查成品数量完全相同（如同一组合在不同价格区间、
+        不同原料宽度上的方案）以及只多一件成品的方案。
+        """
+        if len(patterns) == 0:
+            self.stats.pattern_counts["presolved"] = 0
+            return patterns
+        counts = np.ascontiguousarray(patterns.counts)
+        costs = self._pattern_costs(patterns)
+        row_dtype = np.dtype((np.void, counts.itemsize * counts.shape[1]))
+
+        # 成品数量相同的方案只保留成本最低的一个
+        keys, groups = np.unique(counts.view(row_dtype).ravel(), return_inverse=True)
+        order = np.lexsort((costs, groups))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = groups[order][1:] != groups[order][:-1]
+        representative = order[first]  # 每组数量对应的方案序号，与keys一一对应
+        keep = np.zeros(len(patterns), dtype=bool)
+        keep[representative] = True
+
+        # 某方案比另一方案多一件成品且成本不更高时，去掉后者
+        rep_counts, rep_costs = counts[representative], costs[representative]
+        for i in range(counts.shape[1]):
+            rows = np.nonzero(rep_counts[:, i] > 0)[0]
+            fewer = rep_counts[rows].copy()
+            fewer[:, i] -= 1
+            fewer_keys = fewer.view(row_dtype).ravel()
+            pos = np.minimum(np.searchsorted(keys, fewer_keys), len(keys) - 1)
+            found = (keys[pos] == fewer_keys) & (rep_costs[rows] <= rep_costs[pos])
+            keep[representative[pos[found]]] = False
+
+        print(f"预处理去掉{len(patterns) - keep.sum()}个被占优的方案。")
+        self.stats.pattern_counts["presolved"] = int(keep.sum())
+        return patterns.take(keep)
+
+    def _build_model(self, patterns, max_patterns, integer=True, integer_lengths=False):
+        """
+        用方案数量矩阵批量建立整数规划模型，只添加非零系数。
+        :param integer: False时建立LP松弛
+        :param integer_lengths: 使用长度取整数（mm），见PatternModel
+        :return: PatternModel
+        """
+        demands = self.products.total_length.to_numpy(dtype=float)
+        return PatternModel(patterns.counts, self._pattern_costs(patterns), demands, max_patterns,
+                            self._big_m(patterns), integer, integer_lengths)
+
+    def _big_m(self, patterns):
+        """
+        每个方案最多只需用到其中某种成品单独满足需求的长度，再长只会增加成本，
+        以此作为该方案的长度上限和大M，比统一的大M紧得多
+        """
+        counts = patterns.counts
+        demands = self.products.total_length.to_numpy(dtype=float)
+        return np.divide(demands, counts, out=np.zeros(counts.shape), where=counts > 0).max(axis=1, initial=0)
+
+    def _heuristic_plan(self, patterns, max_patterns, restarts=8):
+        """
+        贪心构造不超过max_patterns个方案的可行解：每一步选择"把其中尚未满足的成品全部做完"时
+        单位产出成本最低的方案，最后一步只考虑能覆盖全部剩余成品的方案；选定方案后再用LP重新
+        分配各方案的使用长度。第一步依次尝试得分最好的restarts个方案，取其中成本最低的结果。
+        :return: 每个方案的使用长度（np.ndarray），找不到可行解时返回None
+        """
+        counts = patterns.counts
+        costs = self._pattern_costs(patterns)
+        demands = self.products.total_length.to_numpy(dtype=float)
+        widths = self.products.width.to_numpy(dtype=float)
+        if len(patterns) == 0 or max_patterns < 1:
+            return None
+
+        # 剩余需求的判断用相对误差，避免大数相减的舍入误差让同一方案被重复选中
+        eps = 1e-9 * demands
+
+        def scores(residual, last_step):
+            active = residual > eps
+            contains = (counts > 0) & active
+            need = np.divide(residual, counts, out=np.zeros(counts.shape), where=contains).max(axis=1)
+            covered = contains.dot(widths * residual)
+            score = np.divide(costs * need, covered, out=np.full(len(costs), np.inf), where=covered > 0)
+            if last_step:
+                score[~contains[:, active].all(axis=1)] = np.inf
+            return score, need
 
-    def solve(self, max_patterns):
-
-        # 生成所有的裁剪方案
-        generator = CuttingPatterns(raw_materials=self.raw_materials, products=self.products)
-        patterns_df = generator.generate(cost_df=self.cost_df)  # {width:DataFrame(Patterns)}
-
-        # 创建SCIP求解器实例
-        solver = pywraplp.Solver.CreateSolver("SCIP")
-        if not solver:
-            return "Solver 初始化失败。"
-
-        # 定义变量
-        variables = {}
-        for idx, row in patterns_df.iterrows():
-            variables[idx] = {
-                "l": solver.NumVar(0, solver.Infinity(), f"l_{idx}"),
-                "y": solver.BoolVar(f"y_{idx}")
-            }
-
-        # 定义目标函数
-        objective = solver.Objective()  # 目标为使用原材料的价值最小
-        for idx, row in patterns_df.iterrows():
-            cost = float(row["cost"] * (row["raw_width"] - row["trim_width"] / 2))
-            objective.SetCoefficient(variables[idx]["l"], cost)
+        def greedy(first):
+            residual = demands.copy()
+            chosen = []
+            for step in range(max_patterns):
+                if not (residual > eps).any():
+                    break
+                score, need = scores(residual, step == max_patterns - 1)
+                p = first if step == 0 else int(np.argmin(score))
+                if not np.isfinite(score[p]):
+                    return None
+                chosen.append(p)
+                residual = np.maximum(residual - counts[p] * need[p], 0)
+            if (residual > eps).any():
+                return None
+            return chosen
+
+        first_scores, _ = scores(demands, max_patterns == 1)
+        best = None
+        for first in np.argsort(first_scores)[:restarts]:
+            if not np.isfinite(first_scores[first]):
+                break
+            chosen = greedy(int(first))
+            len_used = self._polish(counts, costs, chosen) if chosen is not None else None
+            if len_used is not None and (best is None or costs.dot(len_used) < costs.dot(best)):
+                best = len_used
+        return best
+
+    def _polish(self, counts, costs, chosen):
+        """
+        在选定的方案上求解LP，得到成本最低的使用长度
+        :param chosen: 选定方案的序号
+        :return: 每个方案的使用长度（np.ndarray），选定的方案不能满足需求时返回None
+        """
+        demands = self.products.total_length.to_numpy(dtype=float)
+        solver = pywraplp.Solver.CreateSolver("GLOP")
+        lengths = [solver.NumVar(0, solver.infinity(), f"l_{p}") for p in chosen]
+        for i, demand in enumerate(demands):
+            constraint = solver.Constraint(float(demand), solver.infinity())
+            for p, l in zip(chosen, lengths):
+                constraint.SetCoefficient(l, float(counts[p, i]))
+        objective = solver.Objective()
+        for p, l in zip(chosen, lengths):
+            objective.SetCoefficient(l, float(costs[p]))
         objective.SetMinimization()
+        if solver.Solve() != pywraplp.Solver.OPTIMAL:
+            return None
+        len_used = np.zeros(len(costs))
+        np.add.at(len_used, chosen, [l.solution_value() for l in lengths])
+        return len_used
 
-        # 约束条件1: 每种成品的总长度均被满足
-        for _, product in self.products.iterrows():
-            # 对每种成品，添加约束，使得该成品的总长度不低于要求。
-            lower_bound = float(product["total_length"])
-            constraint = solver.Constraint(lower_bound, solver.infinity())
-            for idx, pattern in patterns_df.iterrows():
-                constraint.SetCoefficient(variables[idx]["l"], float(pattern[product["width"]]))
-
-        # 约束条件2：使用的pattern数不超过限制
-        constraint = solver.Constraint(0, max_patterns)
-        for idx in patterns_df.index:
-            constraint.SetCoefficient(variables[idx]["y"], 1)
-
-        # 约束条件3: 限制长度为0时，使用标记y必须为0
-        M = 1e11
-        for idx in patterns_df.index:
-            solver.Add(variables[idx]["l"] <= variables[idx]["y"] * M)
-
-        # 求解
-        status = solver.Solve()
-
-        # 输出结果
-        if status == pywraplp.Solver.OPTIMAL:
-            print("已找到最优解！")
+    def _lp_relaxation(self, patterns, max_patterns):
+        """用GLOP求解整数规划模型的LP松弛，结果中包含各方案的检验数"""
+        return self._build_model(patterns, max_patterns, integer=False).solve("GLOP")
+
+    def _lp_bound(self, patterns, max_patterns):
+        """LP松弛的最优值，即成本下界"""
+        outcome = self._lp_relaxation(patterns, max_patterns)
+        return outcome.objective_value if outcome.status == "OPTIMAL" else None
+
+    def _restrict_patterns(self, patterns, relaxation, len_used):
+        """
+        先定价后分支的限制主问题：只保留LP解中使用的、检验数不超过单位长度成本的
+        REDUCED_COST_TOLERANCE倍的方案，以及初始解中使用的方案（保证限制后仍然可行）
+        :param relaxation: _lp_relaxation的结果
+        :param len_used: 初始解，None表示没有
+        :return: (保留的方案, 对应的初始解)
+        """
+        keep = np.zeros(len(patterns), dtype=bool)
+        if relaxation.len_used is not None:
+            keep |= relaxation.len_used >= 1e-6
+        if relaxation.reduced_costs is not None:
+            keep |= relaxation.reduced_costs <= self.REDUCED_COST_TOLERANCE * self._pattern_costs(patterns)
+        if len_used is not None:
+            keep |= len_used >= 1e-6
+            len_used = len_used[keep]
+        self.stats.pattern_counts["restricted"] = int(keep.sum())
+        print(f"先定价后分支：在{keep.sum()}/{len(patterns)}个方案上求解整数规划。")
+        return patterns.take(keep), len_used
+
+    def _make_result(self, patterns, len_used):
+        result = patterns.to_frame()
+        result["len_used"] = len_used
+        result = result[result["len_used"] >= 1e-6].copy()
+        result.attrs.update(status=self.status, objective_value=self.objective_value,
+                            best_bound=self.best_bound, gap=self.gap, stats=self.stats)
+        self.result = result
+        return result
 
-            # 初始化结果DataFrame
-            result = patterns_df.copy()
-            result["len_used"] = \
-                [variables[idx]["l"].solution_value() for idx in result.index]
-            result = result[result["len_used"] >= 1e-6].copy()
-            self.result = result
-            return result
+    def _best_start(self, patterns, max_patterns, candidates):
+        """
+        从若干初始解中选出可行且成本最低的一个
+        :param candidates: 各方案的使用长度，np.ndarray与patterns逐行对应，
+                           pd.Series按patterns.ids索引（不在其中的方案视为不使用）；None表示没有该解
+        :return: np.ndarray，都不可行时返回None
+        """
+        counts = patterns.counts
+        demands = self.products.total_length.to_numpy(dtype=float)
+        costs = self._pattern_costs(patterns)
+        best = None
+        for len_used in candidates:
+            if len_used is None:
+                continue
+            if isinstance(len_used, pd.Series):
+                len_used = len_used.reindex(patterns.ids, fill_value=0).to_numpy(dtype=float)
+            feasible = ((len_used >= 1e-6).sum() <= max_patterns
+                        and (counts.T.dot(len_used) >= demands * (1 - 1e-9)).all())
+            if feasible and (best is None or costs.dot(len_used) < costs.dot(best)):
+                best = len_used
+        return best
+
+    def _solve_patterns(self, patterns, max_patterns, time_limit=None, mode="mip",
+                        rel_gap=None, progress=None, backend="scip", threads=None, cancel=None):
+        """在给定的裁剪方案上建立整数规划模型并求解"""
+        with self.stats.stage("presolve"):
+            patterns = self._presolve_patterns(patterns)
+        if self._cancelled(cancel):
+            return self._stop_cancelled(patterns, None)
+        return self._solve_presolved(patterns, max_patterns, time_limit, mode, rel_gap, progress, backend, threads,
+                                     cancel=cancel)
+
+    @staticmethod
+    def _cancelled(cancel):
+        return cancel is not None and cancel.is_set()
+
+    def _stop_cancelled(self, patterns, len_used, best_bound=None):
+        """
+        已取消求解，不再进入后面的阶段
+        :param len_used: 已经得到的可行解（如贪心解），作为结果返回；None表示没有结果
+        """
+        if len_used is None:
+            self._set_outcome("NO_SOLUTION_FOUND", None, best_bound)
+            print("已取消求解")
+            return None
+        self._set_outcome("FEASIBLE", self._pattern_costs(patterns).dot(len_used), best_bound)
+        print("已取消求解，返回贪心解")
+        return self._make_result(patterns, len_used)
+
+    def _solve_presolved(self, patterns, max_patterns, time_limit=None, mode="mip", rel_gap=None,
+                         progress=None, backend="scip", threads=None, model=None, warm_starts=(), cancel=None):
+        """
+        在预处理后的方案上求解
+        :param backend: 整数规划求解器，见solve
+        :param cancel: 见solve
+        :param model: 在同一组方案上已建立的PatternModel，只修改方案数上限后重新求解；None表示新建
+        :param warm_starts: 其他参数下得到的解，见_best_start；比贪心解更好时作为初始解
+        """
+        self.live_patterns, self.live_model, self.solved_model = patterns, None, None
+        costs = self._pattern_costs(patterns)
+        # 只在部分方案上求解时，求解器给出的下界不是原问题的下界，改用outer_bound
+        restricted = not self.complete_patterns
+        outer_bound = self.pattern_bound
+
+        # 贪心构造初始可行解
+        with self.stats.stage("heuristic"):
+            len_used = self._heuristic_plan(patterns, max_patterns)
+            if warm_starts:
+                len_used = self._best_start(patterns, max_patterns, [len_used, *warm_starts])
+        heuristic_value = costs.dot(len_used) if len_used is not None else None
+        if self._cancelled(cancel):
+            return self._stop_cancelled(patterns, len_used, outer_bound)
+
+        if mode == "heuristic":
+            with self.stats.stage("lp_bound"):
+                self.best_bound = outer_bound if restricted else self._lp_bound(patterns, max_patterns)
+            if len_used is None:
+                self._set_outcome("NO_SOLUTION_FOUND", None, self.best_bound)
+                print("快速求解未找到可行解")
+                return None
+            self._set_outcome("FEASIBLE", heuristic_value, self.best_bound)
+            if self.gap is not None:
+                print(f"快速求解完成，成本比LP下界高{self.gap:.2%}。")
+            return self._make_result(patterns, len_used)
+        elif mode == "price_and_branch":
+            # 限制后的方案与传入的模型不对应，重新建模
+            with self.stats.stage("lp_bound"):
+                relaxation = self._lp_relaxation(patterns, max_patterns)
+            if not restricted:
+                outer_bound = relaxation.objective_value if relaxation.status == "OPTIMAL" else None
+            restricted = True
+            if self._cancelled(cancel):
+                return self._stop_cancelled(patterns, len_used, outer_bound)
+            with self.stats.stage("restrict"):
+                patterns, len_used = self._restrict_patterns(patterns, relaxation, len_used)
+            model = None
+        elif mode != "mip":
+            raise ValueError(f"不支持的求解模式：{mode}")
+        if restricted and progress is not None:
+            mip_progress = progress
+
+            # 限制主问题的下界不是原问题的下界，进度中显示原问题的下界
+            def progress(elapsed, incumbent, bound):
+                return mip_progress(elapsed, incumbent, outer_bound)
+
+        backend = get_backend(backend)
+        with self.stats.stage("build"):
+            if model is None:
+                model = self._build_model(patterns, max_patterns, integer_lengths=backend.integer_lengths)
+            else:
+                model.set_max_patterns(max_patterns)
+        if mode == "mip":
+            self.live_model = model
+        self.stats.n_variables, self.stats.n_constraints = model.n_variables, model.n_constraints
+        if self._cancelled(cancel):
+            return self._stop_cancelled(patterns, len_used, outer_bound if restricted else None)
+
+        # 求解，以贪心解作为初始解提示
+        self.solved_model = model
+        if progress is not None and heuristic_value is not None:
+            progress(0.0, heuristic_value, None)
+        outcome = model.solve(backend.solver, time_limit=time_limit,
+                              rel_gap=self.RELATIVE_MIP_GAP if rel_gap is None else rel_gap,
+                              hint=len_used, progress=progress, threads=threads, cancel=cancel)
+        self.timings["solve"] = outcome.solve_time
+        self.stats.node_count = outcome.node_count
+        print(f"建模用时{self.timings['build']:.2f}秒，求解用时{self.timings['solve']:.2f}秒。")
+
+        # 输出结果，求解器没有找到更好的解时退回贪心解
+        if outcome.len_used is None and len_used is not None:
+            outcome.status, outcome.objective_value, outcome.len_used = "FEASIBLE", heuristic_value, len_used
+        if restricted and outcome.len_used is not None:
+            # 只在部分方案上证明了最优，与原问题下界的差距达到要求才算最优
+            outcome.best_bound = outer_bound
+            gap = ModelResult(outcome.status, outcome.objective_value, outer_bound).gap
+            within_gap = gap is not None and gap <= (self.RELATIVE_MIP_GAP if rel_gap is None else rel_gap)
+            outcome.status = "OPTIMAL" if within_gap else "FEASIBLE"
+        self._set_outcome(outcome.status, outcome.objective_value, outcome.best_bound)
+        if outcome.status == "OPTIMAL":
+            print("已找到最优解！")
+        elif outcome.len_used is not None:
+            gap_text = f"{self.gap:.2%}" if self.gap is not None else "未知"
+            print(f"未证明最优，返回当前最好的可行解，与下界差距{gap_text}。")
         else:
-            print("未找到最优解")
+            print("未找到可行解")
             return None
+        return self._make_result(patterns, outcome.len_used)
+
+    def sweep(self, max_patterns_values, tolerances, method="exhaustive", time_limit=None, mode="mip",
+              rel_gap=None, backend="scip", threads=None):
+        """
+        在多组最大方案数和边丝容忍度下求解，得到成本、方案数和容忍度之间的权衡。
+        只按最大的容忍度生成一次方案，较小的容忍度从中筛选；同一容忍度只建一次模型，
+        依次放宽方案数上限重新求解，并以上一个方案数的解和较小容忍度下同一方案数的解作为初始解。
+        :param max_patterns_values: 最大方案数的列表
+        :param tolerances: 边丝容忍度（mm）的列表
+        :param time_limit: 每组参数的最长求解时间（秒），不含方案生成
+        :param backend: 整数规划求解器，见solve
+        :param threads: 求解器使用的线程数，见solve
+        :return: DataFrame，每组参数一行，列为tolerance、max_patterns、n_patterns（实际使用的方案数）、
+                 status、objective_value、best_bound、gap；
+                 各组参数的结果在sweep_results中，键为(tolerance, max_patterns)，没有可行解时为None
+        """
+        max_patterns_values = sorted(set(max_patterns_values))
+        tolerances = sorted(set(float(tolerance) for tolerance in tolerances))
+        # 方案生成和预处理的统计记录在sweep_stats中，每组参数的求解统计在各自结果的attrs中
+        self.sweep_stats = self.stats = SolveStats(method, mode, backend, threads)
+        self.solve_options = None
+        self.timings = self.stats.timings
+        all_patterns = self._generate(method, tolerances[-1])
+
+        self.sweep_results = {}
+        rows = []
+        smaller_tolerance = None
+        for tolerance in tolerances:
+            self.stats = self.sweep_stats
+            with self.stats.stage("presolve"):
+                patterns = self._presolve_patterns(all_patterns.filter_tolerance(tolerance))
+            model = None
+            if mode == "mip":
+                with self.stats.stage("build"):
+                    model = self._build_model(patterns, max_patterns_values[-1],
+                                              integer_lengths=get_backend(backend).integer_lengths)
+
+            previous = None
+            for max_patterns in max_patterns_values:
+                self.stats = SolveStats(method, mode, backend, threads)
+                self.timings = self.stats.timings
+                smaller = self.sweep_results.get((smaller_tolerance, max_patterns))
+                warm_starts = [result["len_used"] for result in (previous, smaller) if result is not None]
+                result = self._solve_presolved(patterns, max_patterns, time_limit, mode, rel_gap,
+                                               backend=backend, threads=threads, model=model,
+                                               warm_starts=warm_starts)
+                self.sweep_results[(tolerance, max_patterns)] = result
+                rows.append({"tolerance": tolerance, "max_patterns": max_patterns,
+                             "n_patterns": len(result) if result is not None else 0,
+                             "status": self.status, "objective_value": self.objective_value,
+                             "best_bound": self.best_bound, "gap": self.gap})
+                if result is not None:
+                    previous = result
+            smaller_tolerance = tolerance
+        return pd.DataFrame(rows)
+
+    def _set_outcome(self, status, objective_value, best_bound):
+        self.status = status
+        self.objective_value = objective_value
+        self.best_bound = best_bound
+        self.gap = ModelResult(status, objective_value, best_bound).gap
+        self.stats.finish(status, objective_value, best_bound, self.gap)
+
+
+# 取消求解后没有得到可行解（包括尚未开始）的分组的错误信息
+CANCELLED = "已取消"
+# 超过时限仍未完成（如方案生成耗时过长）、被结束求解进程的分组的错误信息
+TIMED_OUT = "超时"
+# 分组超过时限后再等待的时间（秒），留给建模、整理结果和录制
+GROUP_TIMEOUT_GRACE = 30.0
+
+
+def _solve_group(raw_materials, products, cost_df, max_patterns, method, time_limit, mode, rel_gap,
+                 progress_queue=None, group_index=None, tolerance=None, backend="scip", threads=None,
+                 capture=None, cancel=None, started=None):
+    """
+    在子进程中求解一个分组，异常转为错误信息返回，不影响其他分组
+    :param capture: SolveCapture，录制本次求解的输入和统计信息，None表示不录制
+    :param cancel: threading.Event或Manager().Event()，见Solution.solve
+    :param started: Manager().dict()，开始时写入 分组序号: (进程号, 开始时间)，None表示不记录
+    """
+    if started is not None:
+        started[group_index] = (os.getpid(), time.time())
+    def report_progress(elapsed, incumbent, bound):
+        progress_queue.put((group_index, elapsed, incumbent, bound))
+
+    progress = report_progress if progress_queue is not None else None
+
+    solution = Solution(raw_materials=raw_materials, products=products, cost_df=cost_df.copy())
+    options = {"max_patterns": max_patterns, "method": method, "time_limit": time_limit, "mode": mode,
+               "rel_gap": rel_gap, "tolerance": tolerance, "backend": backend, "threads": threads}
+    start = time.perf_counter()
+    try:
+        result = solution.solve(progress=progress, cancel=cancel, **options)
+        error = None
+        if result is None and cancel is not None and cancel.is_set():
+            error = CANCELLED
+        elif result is None:
+            error = "未找到可行解" if time_limit is None else "未在时限内找到可行解"
+    except Exception as e:
+        result, error = None, f"{type(e).__name__}: {e}"
+    if capture is not None:
+        capture.record(solution, options, time.perf_counter() - start, error)
+    return result, error
+
+
+def solve_groups(groups, raw_materials, cost_df, max_patterns, workers=None, timeout=None,
+                 method="exhaustive", mode="mip", rel_gap=None, progress=None, cache=None, stats_path=None,
+                 tolerance=None, backend="scip", threads=None, capture=None, cancel=None, on_result=None):
+    """
+    用进程池并行求解相互独立的多个分组。
+    :param groups: list，每个元素为一个分组的products（DataFrame，包含width和total_length）
+    :param raw_materials: DataFrame,包含width
+    :param cost_df: DataFrame,包含start_width和cost；各分组价格不同时为list，与groups一一对应
+    :param max_patterns: 每个分组最多使用的裁剪方案数
+    :param workers: 进程数，None表示使用全部CPU，1表示在当前进程中依次求解
+    :param timeout: 每个分组的最长求解时间（秒），到时返回当前最好的可行解，None表示不限制；
+                    方案生成不能中断，多进程求解时超过timeout + GROUP_TIMEOUT_GRACE仍未完成的分组
+                    结束其求解进程，错误信息为TIMED_OUT；workers为1时在当前进程中求解，不能强制结束
+    :param method: 求解方式，见Solution.solve
+    :param mode: 求解模式，见Solution.solve
+    :param rel_gap: 可接受的相对差距，见Solution.solve
+    :param progress: 回调函数 progress(分组序号, 用时, 当前最好成本, 成本下界)，在当前进程中调用
+    :param cache: ResultCache，输入与之前某次求解完全相同的分组直接使用缓存的结果，None表示不使用缓存
+    :param stats_path: 把本次求解的各分组的统计信息（result.attrs["stats"]）以JSON lines追加到该文件，
+                       None表示不写入
+    :param tolerance: 允许的边丝宽度（mm），None表示每个分组取最窄成品宽度
+    :param backend: 整数规划求解器，见Solution.solve
+    :param threads: 每个分组求解器使用的线程数；None时CP-SAT把CPU平均分给各进程，SCIP使用默认值
+    :param capture: SolveCapture，录制实际求解（未命中缓存）的各分组，None表示不录制
+    :param cancel: threading.Event，设置后正在求解的分组提前停止并返回当前最好的可行解，
+                   尚未开始的和停止时还没有可行解的分组错误信息为CANCELLED；提前停止的结果不写入缓存
+    :param on_result: 回调函数 on_result(分组序号, result, error)，每个分组完成（含使用缓存的）时在当前进程中调用，
+                      用于逐个展示结果
+    :return: list，与groups顺序一致，每个元素为 (result, error)，
+             求解成功时error为None，失败或超时时result为None
+    """
+    groups = list(groups)
+    cost_dfs = list(cost_df) if isinstance(cost_df, (list, tuple)) else [cost_df] * len(groups)
+    results = [None] * len(groups)
+    keys = [None] * len(groups)
+    if cache is not None:
+        for group_index, products in enumerate(groups):
+            keys[group_index] = group_fingerprint(products, raw_materials, cost_dfs[group_index], max_patterns,
+                                                  method=method, mode=mode, time_limit=timeout, rel_gap=rel_gap,
+                                                  tolerance=tolerance, backend=backend)
+            result = cache.get(keys[group_index])
+            if result is not None:
+                results[group_index] = (result, None)
+    pending_indices = [group_index for group_index, result in enumerate(results) if result is None]
+    if cache is not None and len(pending_indices) < len(groups):
+        print(f"{len(groups) - len(pending_indices)}个分组的输入没有变化，使用缓存的结果。")
+    if on_result is not None:
+        for group_index, outcome in enumerate(results):
+            if outcome is not None:
+                on_result(group_index, *outcome)
+    interrupted = set()  # 取消后才完成的分组，结果可能不是最终的
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(pending_indices))
+    if threads is None and get_backend(backend).integer_lengths:
+        # CP-SAT的并行搜索与进程池共用CPU，避免线程数超过CPU数
+        threads = max((os.cpu_count() or 1) // max(workers, 1), 1)
+    if workers <= 1:
+        for group_index in pending_indices:
+            if cancel is not None and cancel.is_set():
+                results[group_index] = (None, CANCELLED)
+            else:
+                queue = _CallbackQueue(progress) if progress is not None else None
+                results[group_index] = _solve_group(raw_materials, groups[group_index], cost_dfs[group_index],
+                                                    max_patterns, method, timeout, mode, rel_gap, queue,
+                                                    group_index, tolerance, backend, threads, capture, cancel)
+                if cancel is not None and cancel.is_set():
+                    interrupted.add(group_index)
+            if on_result is not None:
+                on_result(group_index, *results[group_index])
+    else:
+        # 用spawn启动子进程：调用方可能是多线程的（如Streamlit服务器、界面的后台求解线程），
+        # fork只复制当前线程，其他线程持有的锁在子进程中永远不会释放
+        context = multiprocessing.get_context("spawn")
+        with context.Manager() as manager:
+            queue = manager.Queue() if progress is not None else None
+            # 子进程不能使用当前进程的threading.Event，取消时转设到Manager的Event
+            remote_cancel = manager.Event() if cancel is not None else None
+            # 各分组的求解进程号和开始时间，用于结束超时的分组、找出异常退出的进程在求解哪个分组
+            started = manager.dict()
+
+            def finish(group_index, outcome):
+                results[group_index] = outcome
+                if remote_cancel is not None and remote_cancel.is_set():
+                    interrupted.add(group_index)
+                if on_result is not None:
+                    on_result(group_index, *outcome)
+
+            def run_pool(batch, pool_size):
+                """
+                用一个进程池求解batch中的分组。一个求解进程异常退出（如内存不足被杀）或超时被结束后，
+                整个进程池不能再用，其他分组的future也都失败
+                :return: (尚未开始或被连累、需要重新求解的分组, 与异常退出的进程同时在求解的分组)
+                """
+                for group_index in batch:
+                    started.pop(group_index, None)
+                executor = ProcessPoolExecutor(max_workers=min(pool_size, len(batch)), mp_context=context)
+                futures = {executor.submit(_solve_group, raw_materials, groups[group_index], cost_dfs[group_index],
+                                           max_patterns, method, timeout, mode, rel_gap, queue, group_index,
+                                           tolerance, backend, threads, capture, remote_cancel, started): group_index
+                           for group_index in batch}
+                broken, timed_out = [], set()
+                try:
+                    # 等待期间把子进程的进度转交给回调函数，完成一个分组就交给on_result
+                    pending = set(futures)
+                    while pending:
+                        done, pending = wait(pending, timeout=0.2)
+                        while queue is not None and not queue.empty():
+                            progress(*queue.get())
+                        if cancel is not None and cancel.is_set() and not remote_cancel.is_set():
+                            remote_cancel.set()
+                            for future in pending:
+                                future.cancel()
+                        if timeout is not None:
+                            for future in pending:
+                                group_index = futures[future]
+                                if group_index in timed_out or group_index not in started:
+                                    continue
+                                pid, start_time = started[group_index]
+                                if time.time() - start_time > timeout + GROUP_TIMEOUT_GRACE:
+                                    timed_out.add(group_index)
+                                    try:
+                                        os.kill(pid, signal.SIGTERM)
+                                    except OSError:  # 进程刚好已经结束
+                                        pass
+                        for future in done:
+                            group_index = futures[future]
+                            try:
+                                outcome = future.result()
+                            except CancelledError:
+                                outcome = (None, CANCELLED)
+                            except BrokenProcessPool:
+                                broken.append(group_index)
+                                continue
+                            finish(group_index, outcome)
+                finally:
+                    executor.shutdown(wait=True, cancel_futures=True)
+
+                retry, suspects = [], []
+                for group_index in broken:
+                    if group_index in timed_out:
+                        finish(group_index, (None, TIMED_OUT))
+                    elif remote_cancel is not None and remote_cancel.is_set():
+                        finish(group_index, (None, CANCELLED))
+                    elif group_index in started:
+                        suspects.append(group_index)
+                    else:
+                        retry.append(group_index)
+                if timed_out:
+                    # 是超时的分组被结束连累了其他分组
+                    retry, suspects = retry + suspects, []
+                elif not suspects:
+                    # 子进程在开始求解前就退出了，重试也不会成功
+                    for group_index in retry:
+                        finish(group_index, (None, "求解进程异常退出"))
+                    retry = []
+                elif len(suspects) == 1:
+                    finish(suspects[0], (None, "求解进程异常退出"))
+                    suspects = []
+                return retry, suspects
+
+            # 异常退出时同时在求解的分组分不清是哪个出的错，逐个单独重新求解；其他分组在新的进程池中重新求解
+            waiting, isolated = list(pending_indices), []
+            while waiting or isolated:
+                if waiting:
+                    waiting, suspects = run_pool(waiting, workers)
+                else:
+                    waiting, suspects = run_pool([isolated.pop(0)], 1)
+                isolated.extend(suspects)
+
+    for group_index in pending_indices:
+        result, error = results[group_index]
+        if error is not None:
+            continue
+        if cache is not None and group_index not in interrupted:
+            cache.put(keys[group_index], result)
+        if stats_path is not None:
+            result.attrs["stats"].write_jsonl(stats_path, group=group_index)
+    return results
+
+
+class _CallbackQueue:
+    """在当前进程中求解时，用回调函数代替进度队列"""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def put(self, item):
+        self.callback(*item)
@@ -0,0 +1,116 @@
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from pattern_model import get_backend
+from result_cache import group_fingerprint
+
+
+class SolveCapture:
+    """
+    录制生产中的求解实例：每个分组的求解输入（成品、原料、价格、求解参数）和结果统计保存为目录中的
+    一个压缩npz文件，文件名为输入的指纹，同一输入只保存最近一次。求解变慢时可以用benchmarks.replay
+    原样复现并与录制的用时、成本和方案数比较。
+    """
+    # 文件格式变化时修改版本号
+    VERSION = "1"
+
+    def __init__(self, capture_dir, export_mps=False):
+        """
+        :param capture_dir: 录制目录
+        :param export_mps: 同时把实际求解的整数规划模型导出为同名的.mps文件；快速求解不建立整数规划模型，
+                           导出按预处理后的方案建立的完整模型，文件名为<指纹>.presolved.mps
+        """
+        self.capture_dir = Path(capture_dir)
+        self.export_mps = export_mps
+
+    def record(self, solution, options, elapsed, error=None):
+        """
+        保存一次求解。写入失败时只给出提示，不影响求解结果
+        :param solution: 调用过solve的Solution
+        :param options: 传给Solution.solve的参数（不含progress），回放时原样使用
+        :param elapsed: 求解用时（秒）
+        :param error: 求解失败时的错误信息
+        :return: 保存的npz文件路径，失败时为None
+        """
+        key = group_fingerprint(solution.products, solution.raw_materials, solution.cost_df, **options)
+        recorded = {"elapsed": elapsed, "error": error, "status": solution.status,
+                    "objective_value": solution.objective_value, "best_bound": solution.best_bound,
+                    "gap": solution.gap, "n_patterns": len(solution.result) if solution.result is not None else 0,
+                    "stats": solution.stats.to_dict()}
+        meta = {"version": self.VERSION, "recorded_at": time.time(), "options": options, "recorded": recorded}
+        path = self.capture_dir / f"{key}.npz"
+        try:
+            self.capture_dir.mkdir(parents=True, exist_ok=True)
+            self._write(path, lambda f: np.savez_compressed(
+                f,
+                product_widths=solution.products["width"].to_numpy(dtype=float),
+                total_lengths=solution.products["total_length"].to_numpy(dtype=float),
+                raw_widths=solution.raw_materials["width"].to_numpy(),
+                start_widths=solution.cost_df["start_width"].to_numpy(),
+                costs=solution.cost_df["cost"].to_numpy(),
+                meta=np.array(json.dumps(meta, ensure_ascii=False))))
+            if self.export_mps:
+                model, suffix = self._model(solution, options)
+                if model is not None:
+                    mps = model.to_mps().encode("utf-8")
+                    self._write(path.with_suffix(suffix), lambda f: f.write(mps))
+        except (OSError, ValueError) as e:
+            print(f"录制求解实例失败：{e}")
+            return None
+        return path
+
+    @staticmethod
+    def _model(solution, options):
+        """
+        要导出的模型和文件后缀：实际求解的模型为.mps；没有求解整数规划模型时（快速求解、求解前已取消），
+        按预处理后的全部方案重新建立，后缀为.presolved.mps
+        :return: (PatternModel, 后缀)，没有方案时为(None, None)
+        """
+        if solution.solved_model is not None:
+            return solution.solved_model, ".mps"
+        if solution.live_patterns is None:
+            return None, None
+        model = solution._build_model(solution.live_patterns, options["max_patterns"],
+                                      integer_lengths=get_backend(options.get("backend", "scip")).integer_lengths)
+        return model, ".presolved.mps"
+
+    @staticmethod
+    def _write(path, write):
+        # 先写临时文件再改名，多个进程同时写入也不会留下不完整的文件
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def instances(self):
+        """目录中全部录制的实例文件，按文件名排序"""
+        return sorted(self.capture_dir.glob("*.npz"))
+
+    @staticmethod
+    def load(path):
+        """
+        读取一个录制的实例
+        :return: dict，包含products、raw_materials、cost_df（DataFrame），options（求解参数）和
+                 recorded（录制时的用时、状态、成本、方案数和统计信息）
+        """
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("version") != SolveCapture.VERSION:
+                raise ValueError(f"不支持的录制文件版本：{meta.get('version')}")
+            return {"products": pd.DataFrame({"width": data["product_widths"],
+                                              "total_length": data["total_lengths"]}),
+                    "raw_materials": pd.DataFrame({"width": data["raw_widths"]}),
+                    "cost_df": pd.DataFrame({"start_width": data["start_widths"], "cost": data["costs"]}),
+                    "options": meta["options"],
+                    "recorded": meta["recorded"]}
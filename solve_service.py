@@ -0,0 +1,442 @@
+"""
+本机求解服务：多个界面会话共用固定数量的求解进程，避免同时求解时把机器占满。
+任务保存在SQLite中，相同输入的任务只求解一次。
+
+启动：python solve_service.py --port 8765 --workers 2
+接口：
+    POST /jobs         提交一个分组，返回 {"job_id", "status"}；队列已满时返回503
+    GET  /jobs/<id>    查询状态（queued、running、done、failed）、进度和结果
+    GET  /health       排队和运行中的任务数
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pandas as pd
+
+from result_cache import group_fingerprint
+from solution import CANCELLED, _solve_group
+from solve_capture import SolveCapture
+from solve_stats import SolveStats
+
+DEFAULT_DB_PATH = Path.home() / ".cache" / "coilcutter" / "jobs.sqlite3"
+
+
+def frame_to_json(df):
+    return {"columns": list(df.columns), "data": df.to_dict(orient="split", index=False)["data"]}
+
+
+def frame_from_json(data):
+    return pd.DataFrame(data["data"], columns=data["columns"])
+
+
+def result_to_json(result):
+    """求解结果及其attrs转为可以JSON序列化的dict"""
+    attrs = {key: value for key, value in result.attrs.items() if key != "stats"}
+    if result.attrs.get("stats") is not None:
+        attrs["stats"] = result.attrs["stats"].to_dict()
+    return {**frame_to_json(result), "attrs": attrs}
+
+
+def result_from_json(data):
+    result = frame_from_json(data)
+    result.attrs.update(data["attrs"])
+    if data["attrs"].get("stats") is not None:
+        result.attrs["stats"] = SolveStats.from_dict(data["attrs"]["stats"])
+    return result
+
+
+def make_payload(products, raw_materials, cost_df, max_patterns, method="exhaustive", mode="mip",
+                 time_limit=None, rel_gap=None, tolerance=None, backend="scip", threads=None):
+    """一个分组的求解请求，参数与solve_groups相同"""
+    return {"products": frame_to_json(products[["width", "total_length"]]),
+            "raw_widths": raw_materials["width"].tolist(),
+            "cost_df": frame_to_json(cost_df[["start_width", "cost"]]),
+            "max_patterns": max_patterns,
+            "method": method,
+            "mode": mode,
+            "time_limit": time_limit,
+            "rel_gap": rel_gap,
+            "tolerance": tolerance,
+            "backend": backend,
+            "threads": threads}
+
+
+class JobStore:
+    """SQLite中的任务表，任务号为输入的指纹，因此相同的请求对应同一个任务"""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                                id TEXT PRIMARY KEY,
+                                status TEXT NOT NULL,
+                                payload TEXT NOT NULL,
+                                progress TEXT,
+                                result TEXT,
+                                error TEXT,
+                                created REAL NOT NULL,
+                                updated REAL NOT NULL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def submit(self, payload, max_queue):
+        """
+        加入队列。相同输入的任务正在排队、运行或已完成时直接返回它，失败的任务重新排队。
+        :return: (任务号, 状态)，队列已满时状态为None
+        """
+        products = frame_from_json(payload["products"])
+        job_id = group_fingerprint(products, pd.DataFrame({"width": payload["raw_widths"]}),
+                                   frame_from_json(payload["cost_df"]), payload["max_patterns"],
+                                   method=payload["method"], mode=payload["mode"],
+                                   time_limit=payload["time_limit"], rel_gap=payload["rel_gap"],
+                                   tolerance=payload.get("tolerance"), backend=payload.get("backend", "scip"))
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is not None and row[0] != "failed":
+                conn.execute("COMMIT")
+                return job_id, row[0]
+            queued = conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= max_queue:
+                conn.execute("ROLLBACK")
+                return job_id, None
+            conn.execute("INSERT OR REPLACE INTO jobs (id, status, payload, created, updated) "
+                         "VALUES (?, 'queued', ?, ?, ?)", (job_id, json.dumps(payload), now, now))
+            conn.execute("COMMIT")
+        return job_id, "queued"
+
+    def next_queued(self):
+        """取出最早排队的任务并标记为运行中，没有时返回None"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT id, payload FROM jobs WHERE status = 'queued' "
+                               "ORDER BY created LIMIT 1").fetchone()
+            if row is not None:
+                conn.execute("UPDATE jobs SET status = 'running', updated = ? WHERE id = ?", (time.time(), row[0]))
+            conn.execute("COMMIT")
+        return (row[0], json.loads(row[1])) if row is not None else None
+
+    def update(self, job_id, **fields):
+        fields["updated"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT status, progress, result, error FROM jobs WHERE id = ?",
+                               (job_id,)).fetchone()
+        if row is None:
+            return None
+        status, progress, result, error = row
+        return {"job_id": job_id,
+                "status": status,
+                "progress": json.loads(progress) if progress else None,
+                "result": json.loads(result) if result else None,
+                "error": error}
+
+    def counts(self):
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def requeue_running(self):
+        """服务重启时，上次没有完成的任务重新排队"""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET status = 'queued', progress = NULL WHERE status = 'running'")
+
+    def purge(self, max_age):
+        """删除超过max_age秒的已完成和失败的任务"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated < ?",
+                         (time.time() - max_age,))
+
+
+class _JobProgress:
+    """在求解进程中把进度写入任务表，最多每秒写一次"""
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.last_write = 0.0
+
+    def put(self, item):
+        _, elapsed, incumbent, bound = item
+        now = time.monotonic()
+        if now - self.last_write < 1.0:
+            return
+        self.last_write = now
+        self.store.update(self.job_id, progress=json.dumps({"elapsed": elapsed, "incumbent": incumbent,
+                                                            "bound": bound}))
+
+
+def _run_job(db_path, job_id, payload, capture=None):
+    """
+    在求解进程中运行一个任务，并把结果写入任务表
+    :param capture: SolveCapture，录制求解实例，None表示不录制
+    """
+    store = JobStore(db_path)
+    result, error = _solve_group(pd.DataFrame({"width": payload["raw_widths"]}),
+                                 frame_from_json(payload["products"]),
+                                 frame_from_json(payload["cost_df"]),
+                                 payload["max_patterns"], payload["method"], payload["time_limit"],
+                                 payload["mode"], payload["rel_gap"], _JobProgress(store, job_id),
+                                 tolerance=payload.get("tolerance"), backend=payload.get("backend", "scip"),
+                                 threads=payload.get("threads"), capture=capture)
+    if error is not None:
+        store.update(job_id, status="failed", error=error)
+    else:
+        store.update(job_id, status="done", result=json.dumps(result_to_json(result)))
+
+
+class SolveService:
+    """固定数量的求解进程，依次从任务表取出排队的任务"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, workers=2, max_queue=100, keep_seconds=24 * 3600, capture=None):
+        """
+        :param workers: 同时求解的任务数
+        :param max_queue: 最多排队的任务数，超过后拒绝新任务
+        :param keep_seconds: 已完成的任务保留的时间（秒）
+        :param capture: SolveCapture，录制每个任务的求解实例，None表示不录制
+        """
+        self.store = JobStore(db_path)
+        self.workers = workers
+        self.max_queue = max_queue
+        self.keep_seconds = keep_seconds
+        self.capture = capture
+        self._slots = threading.Semaphore(workers)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self.store.requeue_running()
+        self.store.purge(self.keep_seconds)
+        self._executor = self._new_executor()
+        self._thread = threading.Thread(target=self._dispatch, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _new_executor(self):
+        # 求解进程用spawn启动：fork时处理请求的线程可能正打开着任务表，子进程继承SQLite的锁状态后
+        # 写入会丢失甚至损坏数据库
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _replace_broken(self, executor):
+        """求解进程异常退出（如内存不足被杀）后进程池不能再提交任务，换一个新的进程池"""
+        with self._executor_lock:
+            if self._executor is executor:
+                # 可能在进程池自己的线程中调用，不能等待它结束
+                executor.shutdown(wait=False)
+                self._executor = self._new_executor()
+
+    def submit(self, payload):
+        job_id, status = self.store.submit(payload, self.max_queue)
+        if status == "queued":
+            self._wakeup.set()
+        return job_id, status
+
+    def _dispatch(self):
+        last_purge = time.monotonic()
+        while not self._stop.is_set():
+            if time.monotonic() - last_purge > 3600:
+                self.store.purge(self.keep_seconds)
+                last_purge = time.monotonic()
+            if not self._slots.acquire(timeout=1.0):
+                continue
+            job = self.store.next_queued()
+            if job is None:
+                self._slots.release()
+                self._wakeup.wait(timeout=1.0)
+                self._wakeup.clear()
+                continue
+            job_id, payload = job
+            executor = self._executor
+            try:
+                future = executor.submit(_run_job, str(self.store.db_path), job_id, payload, self.capture)
+            except BrokenProcessPool:
+                # 任务还没有开始，换一个进程池后重新排队
+                self._replace_broken(executor)
+                self.store.update(job_id, status="queued")
+                self._slots.release()
+                continue
+            future.add_done_callback(lambda f, job_id=job_id, executor=executor: self._finished(job_id, f, executor))
+
+    def _finished(self, job_id, future, executor):
+        self._slots.release()
+        if future.cancelled():
+            # 服务停止时还没有开始的任务。标记为失败，客户端不再等待，再次提交时重新排队
+            self.store.update(job_id, status="failed", error="求解服务已停止，任务没有开始")
+            return
+        error = future.exception()
+        if error is not None:
+            # 求解进程异常退出时任务表还没有更新
+            self.store.update(job_id, status="failed", error=f"求解进程异常退出：{error}")
+        if isinstance(error, BrokenProcessPool):
+            self._replace_broken(executor)
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, code, body):
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            if self.path != "/jobs":
+                return self._send(404, {"error": "未知的地址"})
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                job_id, status = service.submit(payload)
+            except (ValueError, KeyError, TypeError) as e:
+                return self._send(400, {"error": f"请求格式错误：{e}"})
+            if status is None:
+                return self._send(503, {"error": "求解队列已满，请稍后再试"})
+            self._send(202, {"job_id": job_id, "status": status})
+
+        def do_GET(self):
+            if self.path == "/health":
+                return self._send(200, {"workers": service.workers, "jobs": service.store.counts()})
+            if self.path.startswith("/jobs/"):
+                job = service.store.get(self.path[len("/jobs/"):])
+                if job is None:
+                    return self._send(404, {"error": "任务不存在"})
+                return self._send(200, job)
+            self._send(404, {"error": "未知的地址"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class ServiceError(Exception):
+    pass
+
+
+class SolveClient:
+    """求解服务的客户端"""
+
+    def __init__(self, url, poll_interval=0.5):
+        self.url = url.rstrip("/")
+        self.poll_interval = poll_interval
+
+    def _request(self, method, path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read()).get("error", str(e))
+            except ValueError:
+                message = str(e)
+            raise ServiceError(message) from e
+        except urllib.error.URLError as e:
+            raise ServiceError(f"无法连接求解服务{self.url}：{e.reason}") from e
+
+    def submit(self, payload):
+        return self._request("POST", "/jobs", payload)["job_id"]
+
+    def get(self, job_id):
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def solve_groups(self, groups, raw_materials, cost_df, max_patterns, timeout=None,
+                     method="exhaustive", mode="mip", rel_gap=None, progress=None, tolerance=None,
+                     backend="scip", threads=None, cancel=None, on_result=None):
+        """
+        与solution.solve_groups相同的接口，由求解服务求解
+        :param cost_df: DataFrame；各分组价格不同时为list，与groups一一对应
+        :param progress: 回调函数 progress(分组序号, 用时, 当前最好成本, 成本下界)
+        :param cancel: threading.Event，设置后不再等待未完成的分组，这些分组的错误信息为CANCELLED。
+                       不会取消服务上的任务：相同的请求共用同一个任务，可能还有其他会话在等待，
+                       任务完成后相同的请求可以直接取用结果
+        :param on_result: 回调函数 on_result(分组序号, result, error)，每个分组完成时调用
+        :return: list，与groups顺序一致，每个元素为 (result, error)
+        """
+        groups = list(groups)
+        cost_dfs = list(cost_df) if isinstance(cost_df, (list, tuple)) else [cost_df] * len(groups)
+        job_ids = [self.submit(make_payload(products, raw_materials, group_cost_df, max_patterns, method, mode,
+                                            timeout, rel_gap, tolerance, backend, threads))
+                   for products, group_cost_df in zip(groups, cost_dfs)]
+        results = [None] * len(job_ids)
+        last_progress = [None] * len(job_ids)
+        while any(result is None for result in results):
+            for group_index, job_id in enumerate(job_ids):
+                if results[group_index] is not None:
+                    continue
+                job = self.get(job_id)
+                if job["status"] == "done":
+                    results[group_index] = (result_from_json(job["result"]), None)
+                elif job["status"] == "failed":
+                    results[group_index] = (None, job["error"])
+                elif cancel is not None and cancel.is_set():
+                    results[group_index] = (None, CANCELLED)
+                if results[group_index] is not None:
+                    if on_result is not None:
+                        on_result(group_index, *results[group_index])
+                elif progress is not None and job["progress"] and job["progress"] != last_progress[group_index]:
+                    last_progress[group_index] = job["progress"]
+                    progress(group_index, job["progress"]["elapsed"], job["progress"]["incumbent"],
+                             job["progress"]["bound"])
+            if any(result is None for result in results):
+                time.sleep(self.poll_interval)
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本机求解服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 2) // 2, 1),
+                        help="同时求解的任务数，默认为CPU数的一半")
+    parser.add_argument("--max-queue", type=int, default=100, help="最多排队的任务数")
+    parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="任务数据库文件")
+    parser.add_argument("--capture-dir", default=None, help="把每个任务的求解输入和统计信息录制到该目录")
+    parser.add_argument("--capture-mps", action="store_true", help="录制时同时导出MPS格式的模型")
+    args = parser.parse_args(argv)
+
+    capture = SolveCapture(args.capture_dir, export_mps=args.capture_mps) if args.capture_dir else None
+    service = SolveService(args.db, workers=args.workers, max_queue=args.max_queue, capture=capture)
+    service.start()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"求解服务已启动：http://{args.host}:{args.port}，{args.workers}个求解进程")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
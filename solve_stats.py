@@ -0,0 +1,86 @@
+import json
+import sys
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows没有resource模块
+    resource = None
+
+
+def peak_rss_bytes():
+    """当前进程启动以来的峰值常驻内存（字节），无法获取时返回None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS上单位为字节，Linux等其他系统上为KB
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class SolveStats:
+    """一个分组从生成方案到求解的各阶段统计信息"""
+
+    def __init__(self, method=None, mode=None, backend=None, threads=None):
+        """
+        :param method: 方案生成方式，见Solution.solve
+        :param mode: 求解模式，见Solution.solve
+        :param backend: 整数规划求解器，见Solution.solve
+        :param threads: 求解器使用的线程数
+        """
+        self.method = method
+        self.mode = mode
+        self.backend = backend
+        self.threads = threads
+        self.timings = {}  # 各阶段用时（秒）
+        self.pattern_counts = {}  # 各阶段后的方案数
+        self.cache_hit = None  # 枚举结果是否来自缓存
+        self.iterations = None  # 列生成的迭代次数
+        self.n_variables = None
+        self.n_constraints = None
+        self.status = None
+        self.node_count = None
+        self.objective_value = None
+        self.best_bound = None
+        self.gap = None
+        # 求解进程启动以来的峰值内存，不是本分组单独的用量：进程池中复用的进程包括之前求解过的分组，
+        # 在当前进程中求解时（workers为1）包括调用方（如界面服务器）本身
+        self.peak_rss_bytes = None
+
+    @contextmanager
+    def stage(self, name):
+        """统计with块的用时，同名阶段多次执行时累加"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    def finish(self, status, objective_value, best_bound, gap):
+        """记录最终结果和求解进程的峰值内存"""
+        self.status = status
+        self.objective_value = objective_value
+        self.best_bound = best_bound
+        self.gap = gap
+        self.peak_rss_bytes = peak_rss_bytes()
+
+    def to_dict(self):
+        return {key: (float(value) if hasattr(value, "dtype") else value)
+                for key, value in vars(self).items()}
+
+    @classmethod
+    def from_dict(cls, data):
+        """由to_dict的结果还原"""
+        stats = cls()
+        for key, value in data.items():
+            if hasattr(stats, key):
+                setattr(stats, key, value)
+        return stats
+
+    def write_jsonl(self, path, **extra):
+        """
+        以一行JSON追加到文件
+        :param extra: 额外写入的字段，如分组序号
+        """
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({**extra, **self.to_dict()}, ensure_ascii=False) + "\n")
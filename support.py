@@ -1,9 +1,162 @@
-import pandas as pd
-import streamlit as st
 import math
+from itertools import islice
 
+import numpy as np
+import openpyxl
+import pandas as pd
 
-# import openpyxl
+try:
+    import python_calamine  # 可选依赖，读取xlsx比openpyxl快得多
+except ImportError:
+    python_calamine = None
+
+# 解析规格得到的各列，顺序与SupportBracket._parse_spec的返回值一致
+SPEC_COLUMNS = ["shape", "height", "dimension_B", "dimension_C", "thickness", "length", "diameter",
+                "specification"]
+# 各形状的参数个数及其对应的列，U型钢没有卷边，圆管只有直径、厚度和长度
+SPEC_PARAMETERS = {"C": ["height", "dimension_B", "dimension_C", "thickness", "length"],
+                   "U": ["height", "dimension_B", "thickness", "length"],
+                   "Φ": ["diameter", "thickness", "length"]}
+SPEC_COUNT_ERRORS = {"C": "C型钢应该有5个参数。", "U": "U型钢应该有4个参数。", "Φ": "圆管应该有三个参数。"}
+
+# 已解析的规格：规范化后的规格字符串 -> (解析结果, 错误信息)
+_spec_cache = {}
+SPEC_CACHE_SIZE = 100000
+
+
+class SpecificationError(ValueError):
+    """规格有误，errors为parse_specifications返回的错误报告"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("；".join(f"请检查规格{row.specification}: {row.error}" for row in errors.itertuples()))
+
+
+def normalize_specification(spec):
+    """预处理，变为大写，去除所有空格，替换φ的错误写法Ø"""
+    return str(spec).upper().replace(" ", "").replace("Ø", "Φ")
+
+
+def _parse_normalized(spec):
+    """
+    解析一个已规范化的规格
+    :return: (SPEC_COLUMNS各列的值，出错时尺寸为NaN, 错误信息，没有错误时为None)
+    """
+    shape = spec[:1]
+    error = None
+    if shape not in SPEC_PARAMETERS:
+        error = "规格应该以C、U或者Φ开头。"
+    elif len(spec) < 2:
+        error = "规格必须带参数。"
+    else:
+        parts = spec[1:].split("*")
+        if "" in parts:
+            error = "有空参数（*前后没有数字，或者连用两个*）。"
+        elif len(parts) != len(SPEC_PARAMETERS[shape]):
+            error = SPEC_COUNT_ERRORS[shape]
+        else:
+            try:
+                numbers = [float(part) for part in parts]
+            except ValueError:
+                error = "包含非数字的参数。"
+    if error is not None:
+        return (shape,) + (math.nan,) * (len(SPEC_COLUMNS) - 2) + (spec,), error
+
+    # 该形状没有的尺寸为0
+    values = dict.fromkeys(SPEC_COLUMNS[1:-1], 0.0)
+    values.update(zip(SPEC_PARAMETERS[shape], numbers))
+    return (shape, *values.values(), spec), None
+
+
+def parse_specification(spec):
+    """解析一个规格，结果在进程内缓存，见parse_specifications"""
+    entry = _spec_cache.get(spec)
+    if entry is None:
+        if len(_spec_cache) >= SPEC_CACHE_SIZE:
+            _spec_cache.clear()
+        entry = _spec_cache[spec] = _parse_normalized(normalize_specification(spec))
+    return entry
+
+
+def parse_specifications(specs):
+    """
+    批量解析规格，如C100*35*10*2.5*9775、U120*50*2*6000、Φ60*2*5000。
+    订单中的规格大量重复，先用pd.factorize去重，每种规格只解析一次，并在进程内缓存，
+    再按编号整列展开为结果。
+    :param specs: 规格字符串的序列
+    :return: (DataFrame，列为SPEC_COLUMNS，尺寸为float，出错的行尺寸为NaN，
+              DataFrame，错误报告，列为row（第几个规格）、specification、error，没有错误时为空)
+    """
+    codes, uniques = pd.factorize(pd.Series(specs, dtype=object).fillna("").astype(str))
+    entries = [parse_specification(spec) for spec in uniques]
+
+    unique_parsed = pd.DataFrame([row for row, _ in entries], columns=SPEC_COLUMNS)
+    unique_parsed[SPEC_COLUMNS[1:-1]] = unique_parsed[SPEC_COLUMNS[1:-1]].astype(float)
+    parsed = unique_parsed.take(codes).reset_index(drop=True)
+
+    unique_errors = np.array([error for _, error in entries] + [None], dtype=object)[:-1]
+    row_errors = unique_errors[codes]
+    bad = np.flatnonzero(pd.notna(row_errors))
+    errors = pd.DataFrame({"row": bad,
+                           "specification": parsed["specification"].to_numpy()[bad],
+                           "error": row_errors[bad]})
+    return parsed, errors
+
+
+# 流式读取订单时每次转换的行数
+EXCEL_CHUNK_ROWS = 5000
+
+
+def _excel_cell(value):
+    """与pd.read_excel一致：整数值的浮点数转为int，空字符串视为空"""
+    if type(value) is float and value.is_integer():
+        return int(value)
+    if value == "":
+        return None
+    return value
+
+
+def read_order_excel(file, chunk_rows=EXCEL_CHUNK_ROWS):
+    """
+    读取订单的第一个工作表，表头可以是中文或英文，只保留SupportBracket的属性列，全空的行跳过。
+    安装了python-calamine时用calamine引擎整表读取，否则用openpyxl只读模式逐行读取，
+    每chunk_rows行转换为一块DataFrame，不在内存中构建整个工作簿。
+    :param file: xlsx文件路径或文件对象
+    :return: DataFrame，列名为英文
+    """
+    if python_calamine is not None:
+        df = display_in_English(pd.read_excel(file, engine="calamine"))
+        df = df[[column for column in df.columns if column in SupportBracket.property_list]]
+        return df.dropna(how="all").reset_index(drop=True)
+
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, ())
+        names = [SupportBracket.Chinese_English_mapping.get(name, name) for name in header]
+        # 需要的列在表中的位置，同名的列只取第一列
+        positions = {}
+        for position, name in enumerate(names):
+            if name in SupportBracket.property_list and name not in positions:
+                positions[name] = position
+        columns, positions = list(positions), list(positions.values())
+
+        chunks = []
+        while True:
+            block = list(islice(rows, chunk_rows))
+            if not block:
+                break
+            chunk = [[_excel_cell(row[position]) if position < len(row) else None for position in positions]
+                     for row in block]
+            chunk = [values for values in chunk if any(value is not None for value in values)]
+            if chunk:
+                chunks.append(pd.DataFrame(chunk, columns=columns))
+    finally:
+        workbook.close()
+    if not chunks:
+        return pd.DataFrame(columns=columns)
+    # 某一块中全为空的列是object类型，合并后重新推断
+    return pd.concat(chunks, ignore_index=True).infer_objects()
 
 
 class SupportBracket:
@@ -49,6 +202,9 @@ class SupportBracket:
         if not prop in English_Chinese_mapping:
             raise ValueError("SupportBrackets: 有属性未翻译！")
 
+    # 单个对象只在需要时创建，用__slots__减少内存占用
+    __slots__ = tuple(prop for prop in property_list if prop != "unfolded_width") + ("_unfolded_width",)
+
     def __init__(self, count=0, specification=None):
         """
         specification: 规格，如C100*35*10*2.5*9775
@@ -74,73 +230,16 @@ class SupportBracket:
 
     @staticmethod
     def validate_specification(spec: str):
-        # 预处理，变为大写，去除所有空格，替换φ的错误写法Ø
-        spec = spec.upper().replace(" ", "").replace("Ø", "Φ")
-
-        try:
-            # 验证首字母
-            shape = spec[0]
-            if shape not in ["C", "U", "Φ"]:
-                raise ValueError("规格应该以C、U或者Φ开头。")
-
-            # 看看是不是只有首字母
-            if len(spec) < 2:
-                raise ValueError("规格必须带参数。")
-
-            # 检查是否有空参数
-            parts = spec[1:].split(sep="*")
-            for part in parts:
-                if part == "":
-                    raise ValueError(f"有空参数（*前后没有数字，或者连用两个*）。")
-
-            # 检查参数数量
-            if shape == "Φ" and len(parts) != 3:
-                raise ValueError("圆管应该有三个参数。")
-            elif shape == "U" and len(parts) != 4:
-                raise ValueError(f"U型钢应该有4个参数。")
-            elif shape == "C" and len(parts) != 5:
-                raise ValueError(f"C型钢应该有5个参数。")
-
-
-        except ValueError as e:
-            st.warning(f"请检查规格{spec}: {e}")
-            return False
-
-        # 验证参数是否为数值
-        try:
-            [float(part) for part in parts]
-        except ValueError:
-            st.warning(f"请检查规格{spec}: 包含非数字的参数。")
-            return False
-
-        return True
+        """规格是否合法，错误原因见parse_specifications的错误报告"""
+        return parse_specification(spec)[1] is None
 
     @staticmethod
     def _parse_spec(spec: str):
-        # 预处理，变为大写，去除所有空格，替换φ的错误写法Ø
-        spec = spec.upper().replace(" ", "").replace("Ø", "Φ")
-
-        # 检查规格字符串规范性
-        SupportBracket.validate_specification(spec)
-
-        # 解析
-        shape = spec[0]
-        parts = [float(p) for p in spec[1:].split("*")]
-
-        # 分类型解析
-        if shape == "C":
-            # C型钢直接解析5个参数
-            height, dimension_B, dimension_C, thickness, length = parts
-            diameter = 0.0
-        elif shape == "U":
-            parts.insert(2, 0)
-            height, dimension_B, dimension_C, thickness, length = parts  # 按顺序赋值
-            diameter = 0.0
-        elif shape == "Φ":
-            diameter, thickness, length = parts
-            height, dimension_B, dimension_C = [0.0] * 3
-
-        return (shape, height, dimension_B, dimension_C, thickness, length, diameter, spec)
+        """解析一个规格，规格有误时抛出SpecificationError"""
+        row, error = parse_specification(spec)
+        if error is not None:
+            raise SpecificationError(pd.DataFrame({"row": [0], "specification": [row[-1]], "error": [error]}))
+        return row
 
     def parse_specification(self, specification=None):
         """解析规格"""
@@ -230,47 +329,144 @@ class SupportBracket:
         """用指定DataFrame的idx行填充实例属性"""
         inst = SupportBracket()
         for prop in df.columns:
-            setattr(inst, prop, df.loc[idx, prop])
+            if prop in SupportBracket.property_list:
+                setattr(inst, prop, df.loc[idx, prop])
         if re_parse:
             inst.parse_specification()
         return inst
 
 
 class Brackets:
-    def __init__(self):
-        self.list = []
+    """
+    按列存储的支架列表，每种属性一列（SupportBracket.property_list）。
+    目标尺寸和展开宽度按形状对整列计算，需要单个对象时再用SupportBracket取出某一行。
+    """
+    # 空对象的默认值，与SupportBracket()一致
+    DEFAULTS = {"shape": "", "height": 0, "dimension_B": 0, "dimension_C": 0, "thickness": 0,
+                "length": 0, "diameter": 0, "specification": "", "count": 0}
+    # 解析目标规格时，SPEC_COLUMNS各列对应的目标尺寸列
+    PARSED_TARGET_COLUMNS = ["shape", "height_t", "dimension_B_t", "dimension_C_t", "thickness_t", "length",
+                             "diameter_t", "specification_t"]
+
+    def __init__(self, df=None):
+        """
+        :param df: DataFrame，列为SupportBracket的属性；unfolded_width为空的行按目标尺寸计算展开宽度
+        """
+        self.df = pd.DataFrame(df if df is not None else {}).reset_index(drop=True)
+        # 最近一次解析规格的错误报告，列为row、specification、error
+        self.errors = pd.DataFrame(columns=["row", "specification", "error"])
+
+    def __len__(self):
+        return len(self.df)
+
+    def __getitem__(self, idx):
+        """取出第idx个支架，返回SupportBracket（副本）"""
+        return SupportBracket.from_dataframe(self.to_dataframe(), idx)
+
+    def __iter__(self):
+        df = self.to_dataframe()
+        return (SupportBracket.from_dataframe(df, idx) for idx in df.index)
+
+    @property
+    def list(self):
+        return list(self)
 
     def add_bracket(self, bracket: SupportBracket):
         """添加一个新的 bracket 到列表"""
-        self.list.append(bracket)
+        self.df = pd.concat([self.df, pd.DataFrame([bracket.to_dict()])], ignore_index=True)
         return self
 
     def remove_bracket(self, idx: int):
         """删除指定索引的bracket"""
-        if 0 <= idx < len(self.list):
-            del self.list[idx]
+        if 0 <= idx < len(self.df):
+            self.df = self.df.drop(index=idx).reset_index(drop=True)
         else:
-            st.warning(f"remove_bracket:传入的索引{idx}不在目标范围内！")
+            raise IndexError(f"remove_bracket:传入的索引{idx}不在目标范围内！")
+
+    def _column(self, name):
+        """取出一列，不存在时返回全为NaN的列"""
+        if name in self.df.columns:
+            return self.df[name]
+        return pd.Series(np.nan, index=self.df.index)
+
+    def _float(self, name):
+        return pd.to_numeric(self._column(name), errors="coerce").astype(float)
+
+    def calculate_unfolded_width(self):
+        """
+        按形状整列计算展开宽度：
+        C型：H + 2B + 2C - 8t；U型：H + 2B + 2C - 4t；圆管：π*(D - t)，保留两位小数
+        """
+        shape = self._column("shape")
+        height, width_b, width_c, thickness, diameter = (
+            self._float(name) for name in ["height_t", "dimension_B_t", "dimension_C_t", "thickness_t",
+                                           "diameter_t"])
+        flanges = height + width_b * 2 + width_c * 2
+        return pd.Series(np.select([shape == "C", shape == "U", shape == "Φ"],
+                                   [flanges - thickness * 8,
+                                    flanges - thickness * 4,
+                                    np.round(math.pi * (diameter - thickness), 2)],
+                                   default=np.nan),
+                         index=self.df.index)
 
     def to_dataframe(self):
         """转换为 DataFrame"""
-        data = [bracket.to_dict() for bracket in self.list]
-        return pd.DataFrame(data)
+        df = self.df.reindex(columns=SupportBracket.property_list)
+        # 没有指定展开宽度的按目标尺寸计算
+        unset = df["unfolded_width"].isna()
+        if unset.any():
+            df["unfolded_width"] = df["unfolded_width"].astype(object).where(
+                ~unset, self.calculate_unfolded_width())
+            df["unfolded_width"] = pd.to_numeric(df["unfolded_width"])
+        return df
+
+    def _parse(self, specs, columns):
+        """整列解析规格，结果写入columns对应的各列，错误记录在errors中"""
+        parsed, self.errors = parse_specifications(specs)
+        for spec_column, column in zip(SPEC_COLUMNS, columns):
+            self.df[column] = parsed[spec_column].to_numpy()
 
     def update_target_dimensions(self):
-        for bracket in self.list:
-            bracket.update_target_dimensions()
+        """利用已有的目标规格计算其他属性"""
+        if len(self.df) > 0:
+            self._parse(self.df["specification_t"], self.PARSED_TARGET_COLUMNS)
 
     def init_target_dimensions(self):
-        for bracket in self.list:
-            bracket.init_target_dimensions()
+        """目标尺寸：实际生产时要达到的尺寸，按形状整列计算"""
+        shape = self._column("shape")
+        height, width_b, width_c, thickness, length, diameter = (
+            self._float(name) for name in ["height", "dimension_B", "dimension_C", "thickness", "length",
+                                           "diameter"])
+        c_type, u_type, pipe = shape == "C", shape == "U", shape == "Φ"
+        channel = c_type | u_type
+
+        def text(values):
+            return values.astype(str)
+
+        self.df["height_t"] = (height - 1).where(channel, self._float("height_t"))
+        self.df["dimension_B_t"] = (width_b - 1).where(channel, self._float("dimension_B_t"))
+        self.df["dimension_C_t"] = (width_c - 0.5).where(c_type, 0).where(channel, self._float("dimension_C_t"))
+        self.df["thickness_t"] = thickness.where(c_type | u_type | pipe, self._float("thickness_t"))
+        self.df["diameter_t"] = diameter.where(pipe, self._float("diameter_t"))
+        spec_t = self._column("specification_t").astype(object)
+        spec_t = spec_t.mask(c_type, "C" + text(self.df["height_t"]) + "*" + text(self.df["dimension_B_t"]) + "*"
+                             + text(self.df["dimension_C_t"]) + "*" + text(thickness) + "*" + text(length))
+        spec_t = spec_t.mask(u_type, "U" + text(self.df["height_t"]) + "*" + text(self.df["dimension_B_t"]) + "*"
+                             + text(thickness) + "*" + text(length))
+        spec_t = spec_t.mask(pipe, "Φ" + text(diameter) + "*" + text(thickness) + "*" + text(length))
+        self.df["specification_t"] = spec_t
 
     @staticmethod
     def from_dataframe(df, re_parse=False):
         """从DataFrame加载"""
         df = df.fillna(0)
-        b = Brackets()
-        b.list = [SupportBracket.from_dataframe(df, idx, re_parse) for idx in df.index]
+        df = df[[column for column in df.columns if column in SupportBracket.property_list]].copy()
+        for column, default in Brackets.DEFAULTS.items():
+            if column not in df.columns:
+                df[column] = default
+        b = Brackets(df)
+        if re_parse:
+            b._parse(b.df["specification"], SPEC_COLUMNS)
         return b
 
     @staticmethod
@@ -284,9 +480,8 @@ class Brackets:
 
     @staticmethod
     def from_excel(file_path, re_parse=False):
-        df = pd.read_excel(file_path, engine="openpyxl")
-        df = display_in_English(df)
-        return Brackets.from_dataframe(df, re_parse)
+        """从按输入模板填写的xlsx加载，见read_order_excel"""
+        return Brackets.from_dataframe(read_order_excel(file_path), re_parse)
 
 
 def display_in_Chinese(df):